@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from bse_core import get_bse_data_by_config
+from gemini_scheduler import PRIORITY_BATCH
+
+DEFAULT_WATCH_STATE_PATH = os.getenv("BSE_WATCH_STATE", "bse_watch_state.json")
+
+watch_configs = [
+    {"name": "Results", "category": "Result"},
+    {"name": "Results", "category": "Board Meeting", "filter": "result"},
+]
+
+
+def config_key(config):
+    # config names repeat ("Results" for both result and board meeting filings), so key on what is queried
+    return "|".join([config.get("category") or "", config.get("subcategory") or "", config.get("filter") or ""])
+
+
+def filing_keys(df):
+    """
+    Identity of each filing: its PDF link, or date and headline for filings that come without one.
+    """
+    links = df["Link"].where(df["Link"].notna() & (df["Link"] != ""), None)
+    fallback = df["Date"].astype(str) + "|" + df["Headline"].fillna("").astype(str)
+    return links.fillna(fallback)
+
+
+# ------------------------------
+# Results season watcher, polls only the open window for new filings
+# ------------------------------
+class BseWatcher:
+    """
+    Polls BSE for new filings of a watchlist, one request per scrip and config per cycle,
+    covering only the last window_days. A high-water mark (latest date seen plus the links,
+    or date and headline when there is no link, seen on that date) per scrip and config is kept in a JSON file, so only new filings reach
+    on_new_filings(scrip_code, config, df_new), also across restarts.
+    The poll interval drops to min_interval when filings arrive and backs off to max_interval when quiet.
+    """
+    def __init__(self, scrip_codes, on_new_filings, configs=watch_configs, state_path=DEFAULT_WATCH_STATE_PATH,
+                 window_days=3, min_interval=120, max_interval=1800, backoff=1.5, emit_existing=False):
+        self.scrip_codes = [str(s) for s in scrip_codes]
+        self.on_new_filings = on_new_filings
+        self.configs = configs
+        self.state_path = state_path
+        self.window_days = window_days
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.emit_existing = emit_existing
+        self.interval = min_interval
+        self._stop = threading.Event()
+        self.high_water_marks = self._load_state()
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def _save_state(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.high_water_marks, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _new_filings(self, scrip_code, config, df):
+        """
+        Rows of df beyond the high-water mark, and move the mark forward.
+        """
+        key = f"{scrip_code}|{config_key(config)}"
+        first_time = key not in self.high_water_marks
+        mark = self.high_water_marks.get(key, {"date": "", "links": []})
+
+        # dates are YYYY-MM-DD strings, so they compare in date order
+        df = df.assign(Date=df["Date"].fillna(""))
+        keys = filing_keys(df)
+        seen_links = set(mark["links"])
+        is_new = (df["Date"] > mark["date"]) | ((df["Date"] == mark["date"]) & ~keys.isin(seen_links))
+        df_new = df[is_new]
+
+        if not df_new.empty:
+            latest_date = max(df_new["Date"])
+            links = seen_links if latest_date == mark["date"] else set()
+            links.update(keys[is_new & (df["Date"] == latest_date)])
+            self.high_water_marks[key] = {"date": latest_date, "links": sorted(links)}
+        elif first_time:
+            self.high_water_marks[key] = mark
+
+        if first_time and not self.emit_existing:
+            return df_new.iloc[0:0]
+        return df_new
+
+    def poll_once(self):
+        """
+        One cycle over the watchlist. Returns the number of new filings found.
+        """
+        today = datetime.now()
+        from_date = (today - timedelta(days=self.window_days)).strftime("%Y%m%d")
+        to_date = today.strftime("%Y%m%d")
+
+        found = 0
+        for scrip_code in self.scrip_codes:
+            for config in self.configs:
+                try:
+                    df = get_bse_data_by_config(scrip_code, from_date, to_date, config)
+                except Exception as e:
+                    print("Watch poll failed for %s %s: %s" % (scrip_code, config["name"], e))
+                    continue
+                if df.empty:
+                    continue
+
+                df_new = self._new_filings(scrip_code, config, df)
+                if not df_new.empty:
+                    found += len(df_new)
+                    try:
+                        self.on_new_filings(scrip_code, config, df_new)
+                    except Exception as e:
+                        print("Handling new filings failed for %s %s: %s" % (scrip_code, config["name"], e))
+
+        self._save_state()
+
+        # busy: poll again soon, quiet: back off gradually
+        if found:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        return found
+
+    def run(self, max_cycles=None):
+        """
+        Poll until stop() is called (or max_cycles cycles have run).
+        """
+        cycles = 0
+        while not self._stop.is_set() and (max_cycles is None or cycles < max_cycles):
+            self.poll_once()
+            cycles += 1
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+# ------------------------------
+# Send new result filings to the extraction job queue
+# ------------------------------
+def reported_quarter_fy(filing_date):
+    """
+    Quarter a filing on filing_date (YYYY-MM-DD) reports on: the fiscal quarter before the one it is filed in.
+    """
+    date = datetime.strptime(filing_date, "%Y-%m-%d")
+    if date.month >= 4:
+        quarter, fiscal_year = (date.month - 4) // 3 + 1, date.year + 1
+    else:
+        quarter, fiscal_year = 4, date.year
+    if quarter == 1:
+        return f"Q4 FY{fiscal_year - 1}"
+    return f"Q{quarter - 1} FY{fiscal_year}"
+
+
+def extraction_queue_callback(job_queue, api_key, type="Consolidated"):
+    """
+    on_new_filings callback that queues an extraction for every new "Result" category PDF.
+    Board meeting intimations carry no numbers and are skipped.
+    """
+    def on_new_filings(scrip_code, config, df_new):
+        if config.get("category") != "Result":
+            return
+        for date, link in zip(df_new["Date"], df_new["Link"]):
+            if link and date:
+                job_queue.submit(reported_quarter_fy(date), type, link, api_key, scrip_code=scrip_code, priority=PRIORITY_BATCH)
+    return on_new_filings
+
+
+if __name__ == "__main__":
+
+    def print_filings(scrip_code, config, df_new):
+        print("New %s filings for %s:" % (config["category"], scrip_code))
+        print(df_new[["Date", "Headline", "Link"]])
+
+    watcher = BseWatcher(["500825", "500180"], print_filings, emit_existing=True)
+    watcher.run()
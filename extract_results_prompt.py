@@ -1,3 +1,5 @@
+import re
+
 instruction = """
 You are an elite financial analyst whose job is to transform company results PDF into standardised formats for analysis. You are being given a dictionary of field names to understand the standard format. The dictionary contains standard names to help you understand what a key is supposed to contain. You will be also given a financial report in PDF format to be processed as uploaded to BSE by the company. Along with this I will specify which quarter is to be extracted and which type of results are needed (standalone or consolidated).
 I will upload a company’s quarterly financial results PDF in each message.
@@ -121,4 +123,11 @@ Some companies dont have subsidiaries or associates either, so they report only
 In such cases, if you are asked for consolidated results or standalone, just return the single set of results that you see for the quarter asked.
 """
 
-Prompt = "Help me extract financial results from the attached PDF. Extract results for {quarter} {year}, {type}. Output strictly in JSON format as per the instructions."
\ No newline at end of file
+Prompt = "Help me extract financial results from the attached PDF. Extract results for {quarter} {year}, {type}. Output strictly in JSON format as per the instructions."
+
+# Standard field names in the order of the dictionary above
+StandardFields = re.findall(
+    r"^(\w+):",
+    instruction.split("Dictionary of Standard Fields")[1].split("Output Format")[0],
+    flags=re.MULTILINE
+)
@@ -0,0 +1,235 @@
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from io import StringIO
+
+import pandas as pd
+
+from gemini_scheduler import PRIORITY_INTERACTIVE
+
+DEFAULT_JOBS_DB_PATH = os.getenv("EXTRACTION_JOBS_DB", "extraction_jobs.db")
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extraction_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL,
+    scrip_code TEXT,
+    quarter TEXT NOT NULL,
+    type TEXT NOT NULL,
+    pdf_link TEXT NOT NULL,
+    link_index INTEGER NOT NULL DEFAULT 0,
+    priority INTEGER NOT NULL DEFAULT 0,
+    model TEXT,
+    prompt_hash TEXT,
+    result_json TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_extraction_jobs_lookup ON extraction_jobs (scrip_code, quarter, type);
+"""
+
+
+# ------------------------------
+# Extraction job queue: SQLite job table + in-process worker threads
+# ------------------------------
+class ExtractionJobQueue:
+    """
+    Runs PDF extractions in background threads so they outlive Streamlit reruns.
+    Jobs and their results live in a SQLite table, shared by every session and tab.
+    API keys are only kept in memory, never written to the table.
+
+    Jobs are claimed by priority (PRIORITY_INTERACTIVE before PRIORITY_BATCH), then in order of submission.
+    Every job records the model and prompt_hash it is run with, so finished results are only
+    picked up again while both are unchanged.
+
+    extract_fn(quarter, type, pdf_link, api_key, priority=...) must return the results DataFrame.
+    on_done(job, df_results), if given, is called after a job succeeds, e.g. to store the results.
+    """
+    def __init__(self, extract_fn, db_path=DEFAULT_JOBS_DB_PATH, num_workers=2, poll_seconds=5, on_done=None,
+                 model=None, prompt_hash=None):
+        self.extract_fn = extract_fn
+        self.on_done = on_done
+        self.model = model
+        self.prompt_hash = prompt_hash
+        self.db_path = db_path
+        self.num_workers = num_workers
+        self.poll_seconds = poll_seconds
+        self._api_keys = {}  # job id -> api key
+        self._api_keys_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._workers = []
+        # bumped whenever a job finishes successfully, lets views built from stored results know they are stale
+        self.results_version = 0
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            # tables made before jobs had a priority, model and prompt hash
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(extraction_jobs)")]
+            if "priority" not in columns:
+                conn.execute("ALTER TABLE extraction_jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+            for column in ["model", "prompt_hash"]:
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE extraction_jobs ADD COLUMN {column} TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_extraction_jobs_claim ON extraction_jobs (status, priority, id)")
+            # jobs left running by a previous process never finished, run them again
+            conn.execute("UPDATE extraction_jobs SET status = ?, updated_at = ? WHERE status = ?", (QUEUED, time.time(), RUNNING))
+
+    @contextmanager
+    def _connect(self):
+        # one short-lived connection per call, commits on success and always closes
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def start(self):
+        """
+        Start the worker threads, safe to call more than once.
+        """
+        if self._workers:
+            return self
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"extraction-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def submit(self, quarter, type, pdf_link, api_key, scrip_code=None, link_index=0, priority=PRIORITY_INTERACTIVE,
+               reuse_pending=True):
+        """
+        Queue an extraction and return its job id. A queued or running job for the same PDF,
+        quarter and type is reused instead (unless reuse_pending is False); a queued one is moved
+        up if this submission is more urgent. Finished jobs are never reused, resubmitting extracts again.
+        priority - PRIORITY_INTERACTIVE for a user's click, PRIORITY_BATCH for bulk submissions
+        """
+        now = time.time()
+        # hold the lock until the key is recorded, so a worker can't claim the job without it
+        with self._api_keys_lock, self._connect() as conn:
+            row = None
+            if reuse_pending:
+                row = conn.execute(
+                    "SELECT id, status FROM extraction_jobs WHERE pdf_link = ? AND quarter = ? AND type = ? AND status IN (?, ?) "
+                    "ORDER BY id DESC LIMIT 1",
+                    (pdf_link, quarter, type, QUEUED, RUNNING)
+                ).fetchone()
+            if row is not None:
+                if row["status"] == QUEUED:
+                    # e.g. re-queued after a restart, its original key is gone
+                    self._api_keys.setdefault(row["id"], api_key)
+                    conn.execute(
+                        "UPDATE extraction_jobs SET priority = MIN(priority, ?), updated_at = ? WHERE id = ?",
+                        (priority, now, row["id"])
+                    )
+                return row["id"]
+
+            cursor = conn.execute(
+                "INSERT INTO extraction_jobs (status, scrip_code, quarter, type, pdf_link, link_index, priority, model, prompt_hash, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (QUEUED, scrip_code, quarter, type, pdf_link, link_index, priority, self.model, self.prompt_hash, now, now)
+            )
+            job_id = cursor.lastrowid
+            self._api_keys[job_id] = api_key
+
+        self._wakeup.set()
+        return job_id
+
+    def get_job(self, job_id):
+        """
+        Return the job as a dict, or None if it doesn't exist.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM extraction_jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def latest_job(self, scrip_code, quarter, type):
+        """
+        Most recent job for a company, quarter and type that is pending, or finished with the current
+        model and prompt, used to pick results back up after a reconnect. Failures are only for the
+        session that submitted them.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM extraction_jobs WHERE scrip_code = ? AND quarter = ? AND type = ? "
+                "AND (status IN (?, ?) OR (status = ? AND model IS ? AND prompt_hash IS ?)) "
+                "ORDER BY id DESC LIMIT 1",
+                (scrip_code, quarter, type, QUEUED, RUNNING, DONE, self.model, self.prompt_hash)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def _claim_next_job(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM extraction_jobs WHERE status = ? ORDER BY priority, id LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE extraction_jobs SET status = ?, updated_at = ? WHERE id = ?", (RUNNING, time.time(), row["id"]))
+        return dict(row)
+
+    def _finish_job(self, job_id, status, result_json=None, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE extraction_jobs SET status = ?, result_json = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, result_json, error, time.time(), job_id)
+            )
+        self._api_keys.pop(job_id, None)
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            job = self._claim_next_job()
+            if job is None:
+                self._wakeup.wait(self.poll_seconds)
+                self._wakeup.clear()
+                continue
+
+            with self._api_keys_lock:
+                api_key = self._api_keys.get(job["id"]) or os.getenv("GEMINI_API_KEY")
+            if api_key is None:
+                self._finish_job(job["id"], FAILED, error="No Gemini API key available for this job, please resubmit.")
+                continue
+
+            try:
+                df_results = self.extract_fn(job["quarter"], job["type"], job["pdf_link"], api_key, priority=job["priority"])
+                self._finish_job(job["id"], DONE, result_json=df_results.to_json(orient="split"))
+            except Exception as e:
+                print("Extraction job %s failed: %s" % (job["id"], e))
+                self._finish_job(job["id"], FAILED, error=f"{e}\n{traceback.format_exc()}")
+                continue
+
+            if self.on_done is not None:
+                try:
+                    self.on_done(job, df_results)
+                except Exception as e:
+                    # results are already saved in the job table, don't fail the job for this
+                    print("on_done for extraction job %s failed: %s" % (job["id"], e))
+            with self._api_keys_lock:
+                self.results_version += 1
+
+
+def job_results_to_dataframe(job):
+    """
+    Results DataFrame of a finished job, None if it has no results.
+    """
+    if not job or not job.get("result_json"):
+        return None
+    return pd.read_json(StringIO(job["result_json"]), orient="split")
@@ -0,0 +1,197 @@
+import glob
+import json
+import os
+import uuid
+
+import numpy as np
+
+import extract_results_prompt
+from financials_dataset import FinancialsDataset, parse_quarter_fy
+from financials_matrix import align_field_name, quarter_label
+
+DEFAULT_CUBE_DIR = os.getenv("FINANCIALS_CUBE_DIR", "financials_cube")
+
+
+def quarter_index(quarter, fiscal_year):
+    """
+    Consecutive quarters get consecutive indexes, so 4 steps back is the same quarter last year.
+    """
+    return int(fiscal_year) * 4 + int(quarter) - 1
+
+
+# ------------------------------
+# Memory-mapped company x standard field x quarter cube
+# ------------------------------
+class FinancialsCube:
+    """
+    Standard field values of many companies as one float32 array of shape
+    (companies, fields, quarters), memory-mapped read only from disk so several
+    processes can share it and only the pages a query touches are loaded.
+    Quarters are a contiguous range, missing values are NaN.
+
+        cube = FinancialsCube.open()
+        cube.screen((cube.yoy_growth("CoreRevenue") > 0.2) & (cube.change("FinanceCost") < 0))
+    """
+    def __init__(self, values, scrip_codes, fields, first_quarter_index):
+        self.values = values
+        self.scrip_codes = scrip_codes
+        self.fields = fields
+        self.first_quarter_index = first_quarter_index
+        self._company_pos = {s: i for i, s in enumerate(scrip_codes)}
+        self._field_pos = {f: i for i, f in enumerate(fields)}
+        self._latest = None
+
+    @property
+    def quarters(self):
+        return [quarter_label(i % 4 + 1, i // 4) for i in range(self.first_quarter_index, self.first_quarter_index + self.values.shape[2])]
+
+    @classmethod
+    def open(cls, root_dir=DEFAULT_CUBE_DIR, retries=1):
+        with open(os.path.join(root_dir, "meta.json")) as f:
+            meta = json.load(f)
+        shape = tuple(meta["shape"])
+        if 0 in shape:
+            values = np.empty(shape, dtype=np.float32)  # nothing extracted yet, empty files can't be mapped
+        else:
+            try:
+                values = np.memmap(os.path.join(root_dir, meta["values_file"]), dtype=np.float32, mode="r", shape=shape)
+            except FileNotFoundError:
+                # meta.json was swapped twice since we read it and our file is gone, read the new one
+                if retries <= 0:
+                    raise
+                return cls.open(root_dir, retries=retries - 1)
+        return cls(values, meta["scrip_codes"], meta["fields"], meta["first_quarter_index"])
+
+    @classmethod
+    def build(cls, dataset=None, root_dir=DEFAULT_CUBE_DIR, type="Consolidated", scrip_codes=None):
+        """
+        (Re)build the cube from the extractions in a FinancialsDataset. The new array is written
+        to a fresh file and meta.json is swapped in atomically, so open readers are never broken.
+        """
+        dataset = dataset or FinancialsDataset()
+        df = dataset.read_financials(scrip_codes=scrip_codes, columns=["scrip_code", "fiscal_year", "quarter", "type", "field", "value"])
+        df = df[df["type"] == type]
+        fields = list(extract_results_prompt.StandardFields)
+        df = df.assign(field=df["field"].map(align_field_name))
+        df = df[df["field"].isin(fields)]
+
+        codes = sorted(df["scrip_code"].unique().tolist())
+        if df.empty:
+            first_q, n_quarters = 0, 0
+        else:
+            q_idx = df["quarter"].astype(int).to_numpy() + df["fiscal_year"].astype(int).to_numpy() * 4 - 1
+            first_q = int(q_idx.min())
+            n_quarters = int(q_idx.max()) - first_q + 1
+
+        shape = (len(codes), len(fields), n_quarters)
+        os.makedirs(root_dir, exist_ok=True)
+        values_file = f"values-{uuid.uuid4().hex}.f4"
+        if 0 not in shape:
+            values = np.memmap(os.path.join(root_dir, values_file), dtype=np.float32, mode="w+", shape=shape)
+            values[:] = np.nan
+            company_pos = {s: i for i, s in enumerate(codes)}
+            field_pos = {f: i for i, f in enumerate(fields)}
+            # vectorized scatter of every (company, field, quarter) value into the cube
+            values[
+                df["scrip_code"].map(company_pos).to_numpy(),
+                df["field"].map(field_pos).to_numpy(),
+                q_idx - first_q,
+            ] = df["value"].to_numpy(dtype=np.float32)
+            values.flush()
+            del values
+
+        # the file being replaced stays until the next build, for readers that read meta.json but haven't mapped it yet
+        previous_file = None
+        try:
+            with open(os.path.join(root_dir, "meta.json")) as f:
+                previous_file = json.load(f).get("values_file")
+        except (OSError, ValueError):
+            pass
+
+        meta = {"values_file": values_file, "shape": shape, "scrip_codes": codes, "fields": fields,
+                "first_quarter_index": first_q, "type": type}
+        tmp_meta = os.path.join(root_dir, f"meta.json.{uuid.uuid4().hex}.tmp")
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, os.path.join(root_dir, "meta.json"))
+
+        # readers that already mapped an old file keep it alive until they close (POSIX)
+        for old_file in glob.glob(os.path.join(root_dir, "values-*.f4")):
+            if os.path.basename(old_file) not in (values_file, previous_file):
+                try:
+                    os.remove(old_file)
+                except OSError:
+                    pass
+        return cls.open(root_dir)
+
+    # ------------------------------
+    # Vectorized queries, all return company x quarter arrays
+    # ------------------------------
+    def company(self, scrip_code):
+        """
+        One company's values, shape (fields, quarters).
+        """
+        return self.values[self._company_pos[str(scrip_code)]]
+
+    def field(self, name):
+        """
+        Values of a standard field, shape (companies, quarters).
+        """
+        return self.values[:, self._field_pos[name], :]
+
+    def _shifted(self, name, periods):
+        current = self.field(name)
+        previous = np.full(current.shape, np.nan, dtype=np.float32)
+        previous[:, periods:] = current[:, :-periods]
+        return current, previous
+
+    def change(self, name, periods=1):
+        """
+        Absolute change over `periods` quarters (1 = QoQ, 4 = YoY).
+        """
+        current, previous = self._shifted(name, periods)
+        return current - previous
+
+    def growth(self, name, periods=1):
+        """
+        Relative growth over `periods` quarters, NaN where the base is missing or not positive.
+        """
+        current, previous = self._shifted(name, periods)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(previous > 0, current / previous - 1, np.nan)
+
+    def yoy_growth(self, name):
+        return self.growth(name, periods=4)
+
+    def latest_quarter_positions(self):
+        """
+        Per company, position of the latest quarter with any standard field reported (-1 if none).
+        """
+        if self._latest is None:
+            has_data = ~np.isnan(self.values).all(axis=1)
+            last = has_data.shape[1] - 1 - np.argmax(has_data[:, ::-1], axis=1)
+            self._latest = np.where(has_data.any(axis=1), last, -1)
+        return self._latest
+
+    def screen(self, mask, quarter=None):
+        """
+        Scrip codes for which a boolean company x quarter mask holds in the given quarter ("Q2 FY2025"),
+        or in each company's latest quarter with a value when quarter is None.
+        """
+        mask = np.asarray(mask)
+        if quarter is not None:
+            q, fy = parse_quarter_fy(quarter)
+            column = quarter_index(q, fy) - self.first_quarter_index
+            if not 0 <= column < mask.shape[1]:
+                return []
+            selected = mask[:, column]
+        else:
+            latest = self.latest_quarter_positions()
+            selected = np.where(latest >= 0, mask[np.arange(mask.shape[0]), latest], False)
+        return [self.scrip_codes[i] for i in np.flatnonzero(selected)]
+
+
+if __name__ == "__main__":
+    cube = FinancialsCube.build()
+    print("Cube shape (companies, fields, quarters):", cube.values.shape)
+    print(cube.screen((cube.yoy_growth("CoreRevenue") > 0.2) & (cube.change("FinanceCost") < 0)))
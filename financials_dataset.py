@@ -0,0 +1,170 @@
+import os
+import re
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+DEFAULT_DATASET_DIR = os.getenv("FINANCIALS_DATASET_DIR", "financials_dataset")
+
+PARTITION_COLS = ["scrip_code", "fiscal_year"]
+
+ANNOUNCEMENTS_SCHEMA = pa.schema([
+    ("scrip_code", pa.string()),
+    ("fiscal_year", pa.int32()),
+    ("quarter", pa.int8()),
+    ("config", pa.string()),
+    ("date", pa.string()),
+    ("headline", pa.string()),
+    ("title", pa.string()),
+    ("link", pa.string()),
+    ("fetched_at", pa.timestamp("us")),
+])
+
+FINANCIALS_SCHEMA = pa.schema([
+    ("scrip_code", pa.string()),
+    ("fiscal_year", pa.int32()),
+    ("quarter", pa.int8()),
+    ("type", pa.string()),
+    ("field", pa.string()),
+    ("field_order", pa.int16()),
+    ("value", pa.float64()),
+    ("pdf_link", pa.string()),
+    ("model", pa.string()),
+    ("prompt_hash", pa.string()),
+    ("extracted_at", pa.timestamp("us")),
+])
+
+# Re-fetches / re-extractions append a full new batch for the group, on read only the latest batch is kept
+ANNOUNCEMENTS_GROUP = ["scrip_code", "fiscal_year", "quarter"]
+FINANCIALS_GROUP = ["scrip_code", "fiscal_year", "quarter", "type"]
+
+
+# ------------------------------
+# Append-only Parquet dataset partitioned by scrip_code / fiscal_year
+# ------------------------------
+class FinancialsDataset:
+    """
+    Columnar store for BSE announcements and Gemini extracted financials.
+    Every append writes new Parquet files into hive style partitions
+    (announcements/scrip_code=500825/fiscal_year=2025/part-....parquet), nothing is rewritten.
+    Readers only touch the partitions and columns they ask for.
+    """
+    def __init__(self, root_dir=DEFAULT_DATASET_DIR):
+        self.root_dir = root_dir
+        self.announcements_dir = os.path.join(root_dir, "announcements")
+        self.financials_dir = os.path.join(root_dir, "financials")
+
+    def _append(self, table, base_dir):
+        if table.num_rows == 0:
+            return
+        ds.write_dataset(
+            table,
+            base_dir,
+            format="parquet",
+            partitioning=partitioning_for(table.schema),
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+
+    def append_announcements(self, scrip_code, df):
+        """
+        Append announcement rows as returned by get_range_quarters_data.
+        """
+        if df is None or df.empty:
+            return
+        df = df.reset_index(drop=True)
+        rows = pd.DataFrame({
+            "scrip_code": str(scrip_code),
+            "fiscal_year": df["FiscalYear"].astype("int32"),
+            "quarter": df["Quarter"].astype("int8"),
+            "config": df["Config"].astype(str),
+            "date": df["Date"],
+            "headline": df["Headline"],
+            "title": df["Title"],
+            "link": df["Link"],
+            "fetched_at": pd.Timestamp.now().floor("us"),
+        })
+        self._append(pa.Table.from_pandas(rows, schema=ANNOUNCEMENTS_SCHEMA, preserve_index=False), self.announcements_dir)
+
+    def append_financials(self, scrip_code, quarter_fy, type, df_results, pdf_link, model, prompt_hash):
+        """
+        Append one extraction (Field + a "Q2 FY2025" value column, as made by extract_results_from_pdf_link)
+        with its provenance.
+        """
+        if df_results is None or df_results.empty:
+            return
+        quarter, fiscal_year = parse_quarter_fy(quarter_fy)
+        df_results = df_results.reset_index(drop=True)
+        value_col = [c for c in df_results.columns if c != "Field"][0]
+        rows = pd.DataFrame({
+            "scrip_code": str(scrip_code),
+            "fiscal_year": fiscal_year,
+            "quarter": quarter,
+            "type": type,
+            "field": df_results["Field"].astype(str),
+            "field_order": range(len(df_results)),
+            "value": pd.to_numeric(df_results[value_col], errors="coerce"),
+            "pdf_link": pdf_link,
+            "model": model,
+            "prompt_hash": prompt_hash,
+            "extracted_at": pd.Timestamp.now().floor("us"),
+        })
+        self._append(pa.Table.from_pandas(rows, schema=FINANCIALS_SCHEMA, preserve_index=False), self.financials_dir)
+
+    def _read(self, base_dir, schema, group, order_col, scrip_codes, fiscal_years, columns, latest_only):
+        if not os.path.isdir(base_dir):
+            return pd.DataFrame(columns=columns or schema.names)
+
+        dataset = ds.dataset(base_dir, format="parquet", partitioning=partitioning_for(schema))
+        filter_expr = None
+        if scrip_codes is not None:
+            filter_expr = ds.field("scrip_code").isin([str(s) for s in scrip_codes])
+        if fiscal_years is not None:
+            fy_expr = ds.field("fiscal_year").isin(list(fiscal_years))
+            filter_expr = fy_expr if filter_expr is None else filter_expr & fy_expr
+
+        # the group and timestamp are needed to drop older batches, trimmed again below
+        read_columns = None
+        if columns is not None:
+            read_columns = list(dict.fromkeys(columns + (group + [order_col] if latest_only else [])))
+
+        df = dataset.to_table(columns=read_columns, filter=filter_expr).to_pandas()
+        if latest_only and not df.empty:
+            df = df[df[order_col] == df.groupby(group, observed=True)[order_col].transform("max")]
+        if columns is not None:
+            df = df[columns]
+        return df.reset_index(drop=True)
+
+    def read_announcements(self, scrip_codes=None, fiscal_years=None, columns=None, latest_only=True):
+        """
+        Announcements for the given companies / fiscal years (all if None), only the requested columns.
+        Only the latest fetch of each quarter is returned unless latest_only is False.
+        """
+        return self._read(self.announcements_dir, ANNOUNCEMENTS_SCHEMA, ANNOUNCEMENTS_GROUP, "fetched_at",
+                          scrip_codes, fiscal_years, columns, latest_only)
+
+    def read_financials(self, scrip_codes=None, fiscal_years=None, columns=None, latest_only=True):
+        """
+        Extracted Field/Value rows, only the latest extraction of each quarter and type unless latest_only is False.
+        """
+        return self._read(self.financials_dir, FINANCIALS_SCHEMA, FINANCIALS_GROUP, "extracted_at",
+                          scrip_codes, fiscal_years, columns, latest_only)
+
+
+def partitioning_for(schema):
+    """
+    Hive partitioning on PARTITION_COLS, typed as in schema.
+    """
+    return ds.partitioning(pa.schema([schema.field(c) for c in PARTITION_COLS]), flavor="hive")
+
+
+def parse_quarter_fy(quarter_fy):
+    """
+    "Q2 FY2025" -> (2, 2025)
+    """
+    match = re.match(r"Q(\d) FY(\d+)", quarter_fy)
+    if not match:
+        raise ValueError(f"Not a quarter label: {quarter_fy}")
+    return int(match.group(1)), int(match.group(2))
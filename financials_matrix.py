@@ -0,0 +1,93 @@
+import re
+
+import pandas as pd
+
+import extract_results_prompt
+from financials_dataset import parse_quarter_fy
+
+
+# ------------------------------
+# Per-company financials matrix: fields as rows, quarters as columns
+# ------------------------------
+class FinancialsMatrixBuilder:
+    """
+    Builds a company's multi-quarter financials matrix from the extractions stored in a
+    FinancialsDataset, and works out which quarters actually need a (re-)extraction:
+    those never extracted, or whose stored PDF is no longer among the quarter's result PDFs.
+    """
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def _stored_links(self, scrip_code, type):
+        """
+        quarter_fy -> PDF link of the latest stored extraction.
+        """
+        df = self.dataset.read_financials(scrip_codes=[scrip_code], columns=["fiscal_year", "quarter", "type", "pdf_link"])
+        df = df[df["type"] == type]
+        return {quarter_label(q, fy): link for q, fy, link in zip(df["quarter"], df["fiscal_year"], df["pdf_link"])}
+
+    def stale_quarters(self, scrip_code, type, bse_documents_df):
+        """
+        quarter_fy -> PDF link to extract, for quarters missing from the matrix or whose PDF has changed.
+        bse_documents_df is the announcements DataFrame from get_range_quarters_data.
+        """
+        results = bse_documents_df[bse_documents_df["Config"].astype(str).str.lower() == "results"]
+        results = results[results["Link"].notna() & (results["Link"] != "")]
+        result_links = {}
+        for q, fy, link in zip(results["Quarter"], results["FiscalYear"], results["Link"]):
+            result_links.setdefault(quarter_label(q, fy), []).append(link)
+
+        stored_links = self._stored_links(scrip_code, type)
+        # a stored link that is still one of the quarter's PDFs is up to date, even if it wasn't the first one
+        return {
+            quarter_fy: links[0]
+            for quarter_fy, links in result_links.items()
+            if stored_links.get(quarter_fy) not in links
+        }
+
+    def build(self, scrip_code, type):
+        """
+        Matrix with standard fields first (in prompt order), then other reported line items,
+        and quarters as columns in chronological order.
+        """
+        df = self.dataset.read_financials(
+            scrip_codes=[scrip_code],
+            columns=["fiscal_year", "quarter", "type", "field", "field_order", "value"]
+        )
+        df = df[df["type"] == type]
+        if df.empty:
+            return pd.DataFrame()
+
+        df = df.assign(
+            quarter_fy=[quarter_label(q, fy) for q, fy in zip(df["quarter"], df["fiscal_year"])],
+            field=df["field"].map(align_field_name),
+        )
+        matrix = df.pivot_table(index="field", columns="quarter_fy", values="value", aggfunc="first", dropna=False)
+
+        # the matrix lists every field reported in any quarter, order unmapped ones by where they usually appear
+        standard_fields = [f for f in extract_results_prompt.StandardFields if f in matrix.index]
+        other_fields = (
+            df[~df["field"].isin(standard_fields)]
+            .groupby("field")["field_order"].median()
+            .sort_values(kind="stable").index.tolist()
+        )
+        quarters = sorted(matrix.columns, key=lambda c: parse_quarter_fy(c)[::-1])
+        return matrix.reindex(index=standard_fields + other_fields, columns=quarters)
+
+
+def quarter_label(quarter, fiscal_year):
+    return f"Q{int(quarter)} FY{int(fiscal_year)}"
+
+
+_standard_fields_by_key = {f.lower(): f for f in extract_results_prompt.StandardFields}
+
+def align_field_name(field):
+    """
+    Line items not mapped to a standard field keep the PDF wording, which varies a little between
+    quarters ("Other Comprehensive Income " vs "Other comprehensive income"). Collapse those variants.
+    """
+    cleaned = re.sub(r"\s+", " ", str(field)).strip()
+    key = cleaned.lower()
+    if key in _standard_fields_by_key:
+        return _standard_fields_by_key[key]
+    return cleaned[:1].upper() + key[1:]
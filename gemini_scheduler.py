@@ -0,0 +1,293 @@
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+
+from google.genai.errors import APIError
+
+# Requests with a lower number go first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# Status codes worth retrying: quota (429) and transient server side errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Free tier limits for gemini-2.5-flash, override via env for paid keys
+DEFAULT_RPM = int(os.getenv("GEMINI_RPM", "10"))
+DEFAULT_TPM = int(os.getenv("GEMINI_TPM", "250000"))
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised when Gemini calls are short-circuited after repeated server failures.
+    """
+
+
+class GeminiRetryError(RuntimeError):
+    """
+    Raised when a Gemini call still fails after all retries.
+    """
+
+
+# ------------------------------
+# Token bucket, refilled continuously at rate_per_minute
+# ------------------------------
+class TokenBucket:
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.rate_per_second = rate_per_minute / 60.0
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def wait_time(self, amount):
+        """
+        Seconds until `amount` tokens are available (0 if available now).
+        Requests larger than the capacity only wait for a full bucket.
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate_per_second
+
+    def consume(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta):
+        """
+        Correct a previous reservation once the real usage is known (positive delta takes more tokens).
+        """
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+    def drain_for(self, seconds):
+        """
+        Empty the bucket so nothing goes out for `seconds`, used when the server says we are over quota.
+        """
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate_per_second)
+
+
+# ------------------------------
+# Circuit breaker, opens after consecutive server failures
+# ------------------------------
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def check(self):
+        """
+        Raise CircuitOpenError while the circuit is open. After reset_timeout a single trial
+        call is let through (half open), everyone else is refused until it succeeds or fails.
+        Returns True for the caller that got the trial call.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return False
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0:
+                raise CircuitOpenError(f"Gemini API is failing, calls paused for another {remaining:.0f}s.")
+            if self.trial_in_flight:
+                raise CircuitOpenError("Gemini API is failing, waiting on a trial call.")
+            self.trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight:
+                # failed trial: open again for another reset_timeout
+                self.trial_in_flight = False
+                self.opened_at = time.monotonic()
+            elif self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """
+        Let another trial through when the trial call ended without telling us anything
+        about API health (e.g. a 4xx, a 429 or a local error). Only the trial holder calls this.
+        """
+        with self.lock:
+            self.trial_in_flight = False
+
+
+class _KeyLimits:
+    """
+    Rate limits, breaker and waiting queue for one API key.
+    """
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.breaker = CircuitBreaker()
+        self.waiting = []  # heap of (priority, seq)
+
+
+# ------------------------------
+# Scheduler that every Gemini call goes through
+# ------------------------------
+class GeminiScheduler:
+    """
+    Schedules Gemini calls per API key with RPM/TPM token buckets, a priority queue
+    (interactive before batch), jittered exponential backoff and a circuit breaker.
+    """
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_backoff=120):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_backoff = max_backoff
+        self._limits = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _get_limits(self, api_key):
+        with self._cond:
+            if api_key not in self._limits:
+                self._limits[api_key] = _KeyLimits(self.rpm, self.tpm)
+            return self._limits[api_key]
+
+    def _acquire(self, limits, priority, estimated_tokens):
+        """
+        Block until this call is first in line for its key and both buckets have room.
+        """
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(limits.waiting, ticket)
+            try:
+                while True:
+                    if limits.waiting[0] == ticket:
+                        wait = max(limits.requests.wait_time(1), limits.tokens.wait_time(estimated_tokens))
+                        if wait == 0:
+                            heapq.heappop(limits.waiting)
+                            limits.requests.consume(1)
+                            limits.tokens.consume(estimated_tokens)
+                            return
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                if ticket in limits.waiting:
+                    limits.waiting.remove(ticket)
+                    heapq.heapify(limits.waiting)
+                raise
+            finally:
+                self._cond.notify_all()
+
+    def _backoff(self, attempt, base_wait, retry_after):
+        # full jitter exponential backoff, but never sooner than the server asked for
+        backoff = random.uniform(0, min(self.max_backoff, base_wait * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            backoff = max(backoff, retry_after)
+        return backoff
+
+    def call(self, fn, api_key, priority=PRIORITY_INTERACTIVE, estimated_tokens=0, max_retries=3, base_wait=5,
+             hold_key_on_quota=True):
+        """
+        Run fn() under the limits of api_key, retrying quota and server errors.
+        Returns whatever fn returns.
+        hold_key_on_quota - on a 429 hold back every call on the key for the retry delay; turn off for
+        optional calls whose endpoint has its own quota (e.g. context caching), so they don't slow the rest down
+        """
+        limits = self._get_limits(api_key)
+
+        for attempt in range(1, max_retries + 1):
+            is_trial = limits.breaker.check()
+            try:
+                self._acquire(limits, priority, estimated_tokens)
+                result = fn()
+            except APIError as e:
+                if e.code not in RETRYABLE_STATUS_CODES:
+                    if is_trial:
+                        limits.breaker.release_trial()
+                    raise
+
+                retry_after = get_retry_after_seconds(e)
+                if e.code == 429:
+                    # quota errors say nothing about API health, hold back everyone on this key instead
+                    if is_trial:
+                        limits.breaker.release_trial()
+                    if hold_key_on_quota:
+                        with self._cond:
+                            limits.requests.drain_for(retry_after or base_wait)
+                else:
+                    limits.breaker.record_failure()
+
+                if attempt == max_retries:
+                    raise GeminiRetryError(f"Gemini API {e.code} error after {max_retries} retries.") from e
+                time.sleep(self._backoff(attempt, base_wait, retry_after))
+                continue
+            except BaseException:
+                if is_trial:
+                    limits.breaker.release_trial()
+                raise
+
+            limits.breaker.record_success()
+            actual_tokens = get_total_token_count(result)
+            if actual_tokens is not None:
+                with self._cond:
+                    limits.tokens.adjust(actual_tokens - estimated_tokens)
+            return result
+
+
+# ------------------------------
+# Helpers for reading Gemini responses and errors
+# ------------------------------
+def get_retry_after_seconds(error):
+    """
+    Retry delay hinted by the server, either as a Retry-After header or a RetryInfo detail ("34s").
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("retry-after") or headers.get("Retry-After")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+
+    details = error.details if isinstance(error.details, dict) else {}
+    details = details.get("error", details).get("details", [])
+    for detail in details:
+        if isinstance(detail, dict) and "retryDelay" in detail:
+            match = re.match(r"([\d.]+)s", str(detail["retryDelay"]))
+            if match:
+                return float(match.group(1))
+    return None
+
+
+def get_total_token_count(response):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Process wide scheduler, shared by every session so limits are enforced per key across users.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = GeminiScheduler()
+        return _scheduler
@@ -1,11 +1,15 @@
 from io import BytesIO
 from google import genai
 from google.genai import types
-from google.genai.errors import ClientError
 from itables import show
 import extract_results_prompt
+from gemini_scheduler import PRIORITY_INTERACTIVE, RETRYABLE_STATUS_CODES, GeminiRetryError, get_scheduler
+from google.genai.errors import APIError
+import hashlib
 import os
 import re
+import threading
+import time
 
 print("Key loaded?", os.getenv("GEMINI_API_KEY") is not None)
 
@@ -35,44 +39,163 @@ def json_to_dataframe(response_text: str) -> pd.DataFrame:
     
     return df
 
+GEMINI_MODEL = "gemini-2.5-flash"
+
+# Identifies the instruction + prompt an extraction was made with, stored as provenance
+PROMPT_HASH = hashlib.sha256(
+    (extract_results_prompt.instruction + extract_results_prompt.Prompt).encode("utf-8")
+).hexdigest()[:16]
+
+# Lifetime of the cached system instruction, refreshed this many seconds before it expires
+INSTRUCTION_CACHE_TTL_SECONDS = 3600
+INSTRUCTION_CACHE_REFRESH_MARGIN_SECONDS = 300
+# After a transient failure (network, 5xx) caching is tried again this soon
+INSTRUCTION_CACHE_RETRY_SECONDS = 60
+
+_clients = {}
+_instruction_caches = {}  # api_key -> (cached content name or None, refresh_at, expires_at)
+_instruction_cache_locks = {}  # api_key -> lock, so a slow create only holds up that key
+_clients_lock = threading.Lock()
+
 def get_gemini_client(api_key=None):
+    """
+    Return a pooled genai.Client for the key, so connections are reused across extractions.
+    """
     key = api_key or os.getenv("GEMINI_API_KEY")
     assert key is not None, "GEMINI_API_KEY must be provided either via argument or environment"
-    return genai.Client(api_key=key)
-    
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = genai.Client(api_key=key)
+        return _clients[key]
+
+def _refresh_instruction_cache(client, api_key, name):
+    """
+    Extend the TTL of the existing cache, or create one if there is none (or it is gone).
+    Both calls go through the scheduler, tried once and without holding back the key on a 429:
+    caching is optional, extraction must not wait on it. Returns the cache name.
+    """
+    ttl = f"{INSTRUCTION_CACHE_TTL_SECONDS}s"
+    scheduler = get_scheduler()
+    if name:
+        try:
+            return scheduler.call(
+                lambda: client.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=ttl)),
+                api_key, max_retries=1, hold_key_on_quota=False
+            ).name
+        except APIError as e:
+            if e.code != 404:  # an expired cache can't be updated, create a new one below
+                raise
+    return scheduler.call(
+        lambda: client.caches.create(
+            model=GEMINI_MODEL,
+            config=types.CreateCachedContentConfig(
+                display_name="extract_results_instruction",
+                system_instruction=extract_results_prompt.instruction,
+                ttl=ttl,
+            ),
+        ),
+        api_key, max_retries=1, hold_key_on_quota=False
+    ).name
+
+def get_instruction_cache_name(client, api_key):
+    """
+    Name of a cached content holding extract_results_prompt.instruction for this key,
+    created or its TTL extended ahead of expiry. Returns None when caching isn't available
+    for the key (e.g. free tier or instruction below the minimum cache size) or the
+    cache call failed; callers then send the instruction inline. Permanent failures,
+    including a 429 (free tier keys have no caching quota), are not retried until the
+    next refresh, transient ones after a minute.
+    """
+    with _clients_lock:
+        lock = _instruction_cache_locks.setdefault(api_key, threading.Lock())
+
+    name, refresh_at, expires_at = _instruction_caches.get(api_key, (None, 0, 0))
+    if time.monotonic() < refresh_at:
+        return name
+
+    # someone else is refreshing this key: use the current cache while it is still alive
+    if not lock.acquire(blocking=name is None or time.monotonic() >= expires_at):
+        return name
+    try:
+        name, refresh_at, expires_at = _instruction_caches.get(api_key, (None, 0, 0))
+        now = time.monotonic()
+        if now < refresh_at:
+            return name
+
+        try:
+            name = _refresh_instruction_cache(client, api_key, name if now < expires_at else None)
+            expires_at = now + INSTRUCTION_CACHE_TTL_SECONDS
+            refresh_at = expires_at - INSTRUCTION_CACHE_REFRESH_MARGIN_SECONDS
+        except Exception as e:
+            print("Instruction caching unavailable, sending it inline: %s" % e)
+            error = e.__cause__ if isinstance(e, GeminiRetryError) else e
+            permanent = isinstance(error, APIError) and (error.code == 429 or error.code not in RETRYABLE_STATUS_CODES)
+            refresh_at = now + (INSTRUCTION_CACHE_TTL_SECONDS if permanent else INSTRUCTION_CACHE_RETRY_SECONDS)
+            # keep a cache that hasn't expired yet, it's still usable until then
+            if now >= expires_at:
+                name = None
+            else:
+                refresh_at = min(refresh_at, expires_at)
+
+        _instruction_caches[api_key] = (name, refresh_at, expires_at)
+        return name
+    finally:
+        lock.release()
+
+def get_generate_content_config(client, api_key):
+    cache_name = get_instruction_cache_name(client, api_key)
+    if cache_name:
+        return types.GenerateContentConfig(cached_content=cache_name)
+    return types.GenerateContentConfig(system_instruction=extract_results_prompt.instruction)
+
 ####################################
-# Extract Results for a given file BytesIO Object
+# Upload a PDF file object (BytesIO or temp file) to Gemini
 ####################################
-def get_extracted_results(quarter, year, type, pdf_bytesIO, api_key=None, max_retries=3, wait_seconds=5):
-    client = get_gemini_client(api_key)
+def upload_pdf(pdf_file, api_key=None, max_retries=3, wait_seconds=5, priority=PRIORITY_INTERACTIVE):
+    """
+    Upload the PDF through the shared scheduler and return the Gemini file (use file.uri in prompts).
+    """
+    key = api_key or os.getenv("GEMINI_API_KEY")
+    client = get_gemini_client(key)
 
-    pdf_bytesIO.seek(0)
-    file = client.files.upload(file=pdf_bytesIO, config={"mime_type": "application/pdf"})
+    def upload():
+        pdf_file.seek(0)  # rewind on every attempt, a failed upload may have read part of it
+        return client.files.upload(file=pdf_file, config={"mime_type": "application/pdf"})
 
-    # Your refined prompt (use the one we crafted earlier)
-    instructions = extract_results_prompt.instruction
+    return get_scheduler().call(upload, key, priority=priority, max_retries=max_retries, base_wait=wait_seconds)
+
+####################################
+# Extract Results for a given PDF file object (BytesIO or temp file)
+####################################
+def get_extracted_results(quarter, year, type, pdf_file, api_key=None, max_retries=3, wait_seconds=5,
+                          priority=PRIORITY_INTERACTIVE, estimated_tokens=8000, uploaded_file=None):
+    """
+    Upload the PDF and ask Gemini to extract results. Both calls go through the shared
+    scheduler, which rate limits per API key and retries quota / server errors.
+    priority - PRIORITY_INTERACTIVE for UI clicks, PRIORITY_BATCH for background jobs
+    uploaded_file - a Gemini file from an earlier upload_pdf, pdf_file is not uploaded again then
+    """
+    key = api_key or os.getenv("GEMINI_API_KEY")
+    client = get_gemini_client(key)
+    scheduler = get_scheduler()
+
+    file = uploaded_file or upload_pdf(pdf_file, key, max_retries=max_retries, wait_seconds=wait_seconds, priority=priority)
+
+    # System instruction comes from the context cache when available
+    config = get_generate_content_config(client, key)
     prompt = extract_results_prompt.Prompt.format(quarter=quarter, year=year, type=type)
 
-    for attempt in range(1, max_retries + 1):
-        try:
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                config=types.GenerateContentConfig(system_instruction=instructions),
-                contents=[
-                    {"file_data": {"file_uri": file.uri}},
-                    {"text": prompt}
-                ],
-            )
-            return response  # success
-        except ClientError as e:
-            if e.status_code == 503:  # server unavailable
-                if attempt < max_retries:
-                    time.sleep(wait_seconds)
-                    continue  # retry
-                else:
-                    raise RuntimeError(f"Gemini API 503 error after {max_retries} retries.") from e
-            else:
-                raise  # re-raise any other errors
+    return scheduler.call(
+        lambda: client.models.generate_content(
+            model=GEMINI_MODEL,
+            config=config,
+            contents=[
+                {"file_data": {"file_uri": file.uri}},
+                {"text": prompt}
+            ],
+        ),
+        key, priority=priority, estimated_tokens=estimated_tokens, max_retries=max_retries, base_wait=wait_seconds
+    )
 
 if __name__ == "__main__":
     """
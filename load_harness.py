@@ -0,0 +1,217 @@
+"""
+Headless load test for streamlit_app.py.
+
+Runs N concurrent sessions through search -> fetch -> extract with Streamlit's AppTest,
+against local stand-ins for BSE and Gemini (no network, no API key needed), and reports
+per-step rerun latency percentiles and memory. AppTest can only drive one app per process,
+so every session runs in its own worker process with its own jobs database and its own scrip
+codes, so no session picks up another one's extraction. The dataset directory is shared.
+
+    python load_harness.py --sessions 8 --iterations 3
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+
+
+# ------------------------------
+# Local stand-ins for BSE and Gemini
+# ------------------------------
+class _FakeGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def install_stand_ins(session_id, bse_latency, gemini_latency):
+    # imported here so the workers only load the app after the environment is set up
+    import extract_results_prompt
+    import streamlit_helpers
+
+    scrip_codes = {}  # company name -> scrip code, unique within and across sessions
+
+    def search_bse_company(query):
+        time.sleep(bse_latency)
+        scrip_code = 500000 + session_id * 1000 + scrip_codes.setdefault(query, len(scrip_codes))
+        return [{"name": f"{query.upper()} LTD", "scrip_code": str(scrip_code)}]
+
+    def get_range_quarters_data(scrip_code, start_q, start_fy, end_q, end_fy, configs):
+        time.sleep(bse_latency)
+        rows = []
+        q, fy = start_q, start_fy
+        while (fy < end_fy) or (fy == end_fy and q <= end_q):
+            for config in configs:
+                rows.append({
+                    "Config": config["name"],
+                    "Date": f"{fy - 1}-{3 * q + 1:02d}-15" if q < 4 else f"{fy}-04-15",
+                    "Headline": f"{config['name']} Q{q} FY{fy}",
+                    "Title": f"{config['name']} for the quarter",
+                    "Link": f"https://example.invalid/{scrip_code}/{fy}/{q}/{config['name'].replace(' ', '_')}.pdf",
+                    "Quarter": q,
+                    "FiscalYear": fy,
+                })
+            q, fy = (1, fy + 1) if q == 4 else (q + 1, fy)
+        return pd.DataFrame(rows)
+
+    def download_pdf_to_spooled_file(pdf_link, max_bytes=None):
+        return BytesIO(b"%PDF-1.4 load test stand-in")
+
+    def get_extracted_results(quarter, year, type, pdf_file, api_key=None, **kwargs):
+        time.sleep(gemini_latency)
+        values = {field: round(random.uniform(-100, 5000), 2) for field in extract_results_prompt.StandardFields}
+        return _FakeGeminiResponse(json.dumps(values))
+
+    streamlit_helpers.search_bse_company = search_bse_company
+    streamlit_helpers.get_range_quarters_data = get_range_quarters_data
+    streamlit_helpers.download_pdf_to_spooled_file = download_pdf_to_spooled_file
+    streamlit_helpers.get_extracted_results = get_extracted_results
+
+
+# ------------------------------
+# One simulated user
+# ------------------------------
+def _button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+def _timed_run(at, timings, step):
+    start = time.perf_counter()
+    at.run()
+    timings.setdefault(step, []).append(time.perf_counter() - start)
+    if at.exception:
+        raise RuntimeError(f"{step}: {at.exception[0].message}")
+
+
+def run_session(session_id, iterations, extract_timeout, bse_latency, gemini_latency):
+    """
+    Worker process entry point. Returns this session's step timings, its memory and the error if it failed.
+    """
+    # every queue resets RUNNING jobs of its database on start, so processes must not share one
+    os.environ["EXTRACTION_JOBS_DB"] = os.path.join(os.environ["LOAD_HARNESS_DIR"], f"extraction_jobs-{session_id}.db")
+    from streamlit.testing.v1 import AppTest
+
+    install_stand_ins(session_id, bse_latency, gemini_latency)
+    local, memory, error = {}, {}, None
+    try:
+        _drive_session(AppTest.from_file(APP_PATH, default_timeout=60), session_id, iterations, extract_timeout, local, memory)
+    except Exception:
+        error = traceback.format_exc()
+    return {"session": session_id, "timings": local, "error": error, "first_run_rss_mb": memory.get("first_run_rss_mb", float("nan")),
+            "rss_mb": current_rss_mb(), "peak_rss_mb": peak_rss_mb()}
+
+
+def _drive_session(at, session_id, iterations, extract_timeout, local, memory):
+    _timed_run(at, local, "initial")
+    # the interpreter, Streamlit and pandas are in every worker, only what a session adds after this counts
+    memory["first_run_rss_mb"] = current_rss_mb()
+
+    for i in range(iterations):
+        company = random.choice(["Britannia", "Nestle", "Dabur", "Marico", f"Company{session_id}"])
+        at.text_input[0].input(company)
+        _button(at, "Search Company").click()
+        _timed_run(at, local, "search")
+
+        _button(at, "Fetch BSE Data").click()
+        _timed_run(at, local, "fetch")
+
+        # a widget change that should not redo any work
+        at.selectbox[1].select_index(min(i, len(at.selectbox[1].options) - 1))
+        _timed_run(at, local, "select_quarter")
+
+        start = time.perf_counter()
+        _button(at, "Extract Results").click()
+        _timed_run(at, local, "extract_submit")
+        while at.session_state["extracted_results"] is None:
+            if time.perf_counter() - start > extract_timeout:
+                raise RuntimeError("extract: no results within %ss" % extract_timeout)
+            time.sleep(0.1)
+            _timed_run(at, local, "extract_poll")
+        local.setdefault("extract_end_to_end", []).append(time.perf_counter() - start)
+
+
+# ------------------------------
+# Reporting
+# ------------------------------
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return float("nan")
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if os.uname().sysname == "Darwin" else peak / 2**10
+
+
+def print_report(results, elapsed):
+    timings = {}
+    for result in results:
+        for step, values in result["timings"].items():
+            timings.setdefault(step, []).extend(values)
+
+    print(f"\n{len(results)} sessions finished in {elapsed:.1f}s")
+    print(f"{'step':<20}{'runs':>6}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, values in timings.items():
+        ms = np.array(values) * 1000
+        print(f"{step:<20}{len(ms):>6}{np.percentile(ms, 50):>10.1f}{np.percentile(ms, 90):>10.1f}"
+              f"{np.percentile(ms, 99):>10.1f}{ms.max():>10.1f}")
+
+    # growth is RSS above the level after the session's first run, i.e. what the session itself added
+    print(f"\n{'session':<10}{'first run MB':>14}{'end MB':>10}{'peak MB':>10}{'growth MB':>12}")
+    for result in sorted(results, key=lambda r: r["session"]):
+        growth = result["rss_mb"] - result["first_run_rss_mb"]
+        print(f"{result['session']:<10}{result['first_run_rss_mb']:>14.0f}{result['rss_mb']:>10.0f}"
+              f"{result['peak_rss_mb']:>10.0f}{growth:>12.1f}")
+    growths = np.array([r["rss_mb"] - r["first_run_rss_mb"] for r in results])
+    print(f"Growth per session: mean {np.nanmean(growths):.1f} MB, max {np.nanmax(growths):.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-user load test for streamlit_app.py")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent sessions")
+    parser.add_argument("--iterations", type=int, default=2, help="search -> fetch -> extract rounds per session")
+    parser.add_argument("--bse-latency", type=float, default=0.05, help="seconds per stand-in BSE call")
+    parser.add_argument("--gemini-latency", type=float, default=0.5, help="seconds per stand-in Gemini extraction")
+    parser.add_argument("--extract-timeout", type=float, default=120, help="seconds to wait for an extraction job")
+    args = parser.parse_args()
+
+    # keep jobs and the dataset of the load test away from the real ones, the workers inherit this environment
+    tmp_dir = tempfile.mkdtemp(prefix="load_harness_")
+    os.environ["LOAD_HARNESS_DIR"] = tmp_dir
+    os.environ["FINANCIALS_DATASET_DIR"] = os.path.join(tmp_dir, "financials_dataset")
+    os.environ["GEMINI_API_KEY"] = "load-test"
+    os.environ["PDF_PREFETCH"] = "off"
+
+    start = time.perf_counter()
+    # spawn, not fork: every worker starts a clean interpreter with its own Streamlit runtime,
+    # and runs a single session so its jobs database and memory figures are that session's alone
+    with ProcessPoolExecutor(max_workers=args.sessions, mp_context=get_context("spawn"), max_tasks_per_child=1) as pool:
+        futures = [pool.submit(run_session, i, args.iterations, args.extract_timeout, args.bse_latency, args.gemini_latency)
+                   for i in range(args.sessions)]
+        results = [future.result() for future in futures]
+
+    print_report(results, time.perf_counter() - start)
+    failures = [r for r in results if r["error"]]
+    for result in failures:
+        print("Session %s failed:\n%s" % (result["session"], result["error"]))
+    print("Jobs and dataset written under", tmp_dir)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,146 @@
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from gemini_scheduler import PRIORITY_BATCH
+
+# off (default), download, or upload (download and warm the Gemini upload with GEMINI_API_KEY)
+PDF_PREFETCH_MODE = os.getenv("PDF_PREFETCH", "off").lower()
+
+
+class _PrefetchedPdf:
+    def __init__(self, pdf_link, owner=None):
+        self.pdf_link = pdf_link
+        self.owner = owner
+        self.pdf_file = None
+        self.uploaded_file = None
+        self.api_key = None
+        self.fetched_at = None
+        self.ready = threading.Event()
+
+    def close(self):
+        if self.pdf_file is not None:
+            self.pdf_file.close()
+            self.pdf_file = None
+
+
+# ------------------------------
+# Speculative prefetch of the result PDFs users are most likely to extract next
+# ------------------------------
+class PdfPrefetcher:
+    """
+    Downloads (and optionally uploads to Gemini) the first "Results" PDF of the most recent
+    quarters in a single low priority background thread, so the first extraction click can
+    skip straight to generation. Uploads go through the scheduler as batch priority, behind
+    any interactive extraction. Prefetches belong to an owner (e.g. a session): a new prefetch()
+    cancels whatever the same owner's previous one hadn't done yet, and each owner keeps at most
+    max_entries PDFs, so sessions don't cancel or evict each other's prefetches.
+
+    download_fn(pdf_link) returns a file object, upload_fn(pdf_file, api_key, priority=...) the Gemini file.
+    """
+    def __init__(self, download_fn, upload_fn=None, max_entries=4, ttl_seconds=3600):
+        self.download_fn = download_fn
+        self.upload_fn = upload_fn
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # pdf_link -> _PrefetchedPdf, oldest first
+        self._lock = threading.Lock()
+        self._tasks = queue.Queue()
+        self._generations = {}  # owner -> generation, bumped to cancel that owner's queued prefetches
+        self._worker = threading.Thread(target=self._worker_loop, name="pdf-prefetch", daemon=True)
+        self._worker.start()
+
+    def prefetch(self, bse_documents_df, quarters=2, api_key=None, owner=None):
+        """
+        Queue the first results PDF of the latest `quarters` quarters for owner. With api_key
+        the PDFs are uploaded to Gemini as well. Returns the queued links.
+        """
+        results = bse_documents_df[bse_documents_df["Config"].astype(str).str.lower() == "results"]
+        results = results[results["Link"].notna() & (results["Link"] != "")]
+        # first link of each quarter is the one extraction tries first
+        first_links = results.drop_duplicates(["FiscalYear", "Quarter"], keep="first")
+        first_links = first_links.sort_values(["FiscalYear", "Quarter"], ascending=False).head(quarters)
+
+        generation = self.cancel(owner)
+        links = first_links["Link"].tolist()
+        for pdf_link in links:
+            self._tasks.put((owner, generation, pdf_link, api_key))
+        return links
+
+    def cancel(self, owner=None):
+        """
+        Drop the owner's queued prefetches, one that is already downloading finishes its current step only.
+        Returns the owner's new generation.
+        """
+        with self._lock:
+            self._generations[owner] = self._generations.get(owner, 0) + 1
+            return self._generations[owner]
+
+    def take(self, pdf_link, api_key=None, timeout=60):
+        """
+        Hand over a prefetched PDF, waiting up to timeout if it is still in flight.
+        Returns (pdf_file, uploaded_file) with either possibly None, or None if the link wasn't prefetched.
+        The caller owns pdf_file and must close it. uploaded_file is only returned for the same api_key.
+        """
+        with self._lock:
+            entry = self._entries.get(pdf_link)
+        if entry is None or not entry.ready.wait(timeout):
+            return None
+
+        with self._lock:
+            if self._entries.get(pdf_link) is not entry:
+                return None
+            del self._entries[pdf_link]
+
+        if entry.fetched_at is None or time.monotonic() - entry.fetched_at > self.ttl_seconds:
+            entry.close()
+            return None
+        uploaded_file = entry.uploaded_file if api_key is not None and entry.api_key == api_key else None
+        return entry.pdf_file, uploaded_file
+
+    def _is_cancelled(self, owner, generation):
+        with self._lock:
+            return generation != self._generations.get(owner, 0)
+
+    def _add_entry(self, entry):
+        with self._lock:
+            self._entries[entry.pdf_link] = entry
+            # evict the owner's oldest PDFs only, other owners' prefetches are left alone
+            owned = [link for link, e in self._entries.items() if e.owner == entry.owner]
+            for link in owned[:max(0, len(owned) - self.max_entries)]:
+                evicted = self._entries.pop(link)
+                evicted.close()
+                evicted.ready.set()
+
+    def _worker_loop(self):
+        while True:
+            owner, generation, pdf_link, api_key = self._tasks.get()
+            with self._lock:
+                in_cache = pdf_link in self._entries
+            if in_cache or self._is_cancelled(owner, generation):
+                continue
+
+            entry = _PrefetchedPdf(pdf_link, owner)
+            self._add_entry(entry)
+            try:
+                entry.pdf_file = self.download_fn(pdf_link)
+                # pre-filter: keep only what really is a PDF, error pages are sometimes served with 200
+                entry.pdf_file.seek(0)
+                if entry.pdf_file.read(5) != b"%PDF-":
+                    raise ValueError("Not a PDF")
+                entry.pdf_file.seek(0)
+
+                if api_key and self.upload_fn is not None and not self._is_cancelled(owner, generation):
+                    entry.uploaded_file = self.upload_fn(entry.pdf_file, api_key, priority=PRIORITY_BATCH)
+                    entry.api_key = api_key
+                entry.fetched_at = time.monotonic()
+            except Exception as e:
+                print("Prefetch of %s failed: %s" % (pdf_link, e))
+                entry.close()
+                with self._lock:
+                    if self._entries.get(pdf_link) is entry:
+                        del self._entries[pdf_link]
+            finally:
+                entry.ready.set()
@@ -0,0 +1,120 @@
+import cProfile
+import os
+import pstats
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+# Profiles can only be dumped to disk when the server sets a directory for them
+PROFILE_DIR = os.getenv("STREAMLIT_PROFILE_DIR")
+# 1: profile every rerun, allow: only reruns with ?profile=1 in the url, anything else: off
+PROFILE_MODE = os.getenv("STREAMLIT_PROFILE", "").lower()
+
+# Only one profiler can be active per process (sys.monitoring on 3.12+), reruns of other sessions run unprofiled meanwhile
+_profiler_lock = threading.Lock()
+
+# App functions broken out in the sidebar panel, their time comes straight from cProfile
+PROFILED_SECTIONS = [
+    "company_select_section",
+    "fetch_bse_documents_section",
+    "pivot_announcement_links",
+    "render_pivot_html_with_icons",
+    "extract_results_section",
+    "financials_matrix_section",
+]
+
+
+def profiling_enabled():
+    """
+    Profiling is on with STREAMLIT_PROFILE=1, or with ?profile=1 in the app url when the
+    server allows it with STREAMLIT_PROFILE=allow. Visitors can't turn it on otherwise.
+    """
+    if PROFILE_MODE == "1":
+        return True
+    return PROFILE_MODE == "allow" and st.query_params.get("profile") == "1"
+
+
+# ------------------------------
+# Profile one rerun of the app and show where the time went
+# ------------------------------
+def run_profiled(main_fn):
+    """
+    Run main_fn under cProfile and render the breakdown in the sidebar. The app itself
+    carries no instrumentation, so nothing runs when profiling is off.
+    """
+    if not _profiler_lock.acquire(blocking=False):
+        return _run_unprofiled(main_fn, "another session's rerun is being profiled")
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # some other tool (a debugger, coverage) already holds the profiling hook
+        _profiler_lock.release()
+        return _run_unprofiled(main_fn, str(e))
+
+    start = time.perf_counter()
+    try:
+        main_fn()
+    finally:
+        # st.rerun / st.stop end the run with an exception, nothing to show for those
+        profiler.disable()
+        _profiler_lock.release()
+    total_seconds = time.perf_counter() - start
+    render_profile_panel(pstats.Stats(profiler), total_seconds)
+
+
+def _run_unprofiled(main_fn, reason):
+    main_fn()
+    st.sidebar.caption(f"Rerun not profiled: {reason}.")
+
+
+def section_breakdown(stats, total_seconds):
+    """
+    Calls and cumulative time of each PROFILED_SECTIONS function in this rerun.
+    """
+    rows = {name: {"Section": name, "Calls": 0, "Time (ms)": 0.0} for name in PROFILED_SECTIONS}
+    for (filename, lineno, funcname), (cc, nc, tt, ct, callers) in stats.stats.items():
+        if funcname in rows:
+            rows[funcname]["Calls"] += nc
+            rows[funcname]["Time (ms)"] += ct * 1000
+
+    df = pd.DataFrame(rows.values())
+    df["% of rerun"] = df["Time (ms)"] / (total_seconds * 1000) * 100
+    return df.sort_values("Time (ms)", ascending=False).reset_index(drop=True)
+
+
+def top_functions(stats, limit=25):
+    rows = [
+        {"Function": f"{funcname} ({os.path.basename(filename)}:{lineno})", "Calls": nc,
+         "Own (ms)": tt * 1000, "Cumulative (ms)": ct * 1000}
+        for (filename, lineno, funcname), (cc, nc, tt, ct, callers) in stats.stats.items()
+    ]
+    return pd.DataFrame(rows).sort_values("Cumulative (ms)", ascending=False).head(limit).reset_index(drop=True)
+
+
+def render_profile_panel(stats, total_seconds):
+    st.sidebar.subheader("Rerun profile")
+    st.sidebar.metric("Last rerun", f"{total_seconds * 1000:.0f} ms")
+    st.sidebar.dataframe(section_breakdown(stats, total_seconds), hide_index=True)
+
+    with st.sidebar.expander("Top functions"):
+        st.dataframe(top_functions(stats), hide_index=True)
+
+    # writes to the server's disk, only where the deployment asked for it
+    if not PROFILE_DIR:
+        return
+
+    # the click itself reruns the app, so dump the profile of the rerun before it
+    if st.sidebar.button("Dump previous rerun profile to disk"):
+        previous_stats = st.session_state.get("last_rerun_profile")
+        if previous_stats is None:
+            st.sidebar.warning("No previous rerun profiled yet.")
+        else:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"rerun-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+            previous_stats.dump_stats(path)
+            st.sidebar.success(f"Saved {path}, view it with e.g. `snakeviz {path}` or `flameprof {path}`.")
+    st.session_state["last_rerun_profile"] = stats
@@ -1,12 +1,16 @@
 
-import traceback
 import streamlit as st
 import os
 
 from dotenv import load_dotenv
 
 from streamlit_app_state import StreamlitAppState
-from streamlit_helpers import configs, extract_results_from_pdf_link, pivot_announcement_links, quarter_sort_key, get_range_quarters_data_cached, render_pivot_html_with_icons, search_bse_company_cached
+from extraction_jobs import DONE, FAILED, job_results_to_dataframe
+from financials_matrix import FinancialsMatrixBuilder
+from gemini_scheduler import PRIORITY_BATCH
+from pdf_prefetch import PDF_PREFETCH_MODE
+from rerun_profiler import profiling_enabled, run_profiled
+from streamlit_helpers import configs, get_extraction_job_queue, get_financials_dataset, get_pdf_prefetcher, pivot_announcement_links, quarter_sort_key, get_range_quarters_data_cached, render_pivot_html_with_icons, search_bse_company_cached
 
 
 
@@ -25,6 +29,8 @@ def company_select_section():
     if search_button and company_input:
         # invalidate previous data
         app_state.reset_all() # new company search, reset all state
+        if PDF_PREFETCH_MODE != "off":
+            get_pdf_prefetcher().cancel(app_state.session_token) # previous company's PDFs won't be needed
         app_state.company_matches = search_bse_company_cached(company_input.lower())
         if not app_state.company_matches:
             st.warning("No matches found. Please refine your search.")
@@ -67,13 +73,23 @@ def fetch_bse_documents_section():
         with st.spinner("Fetching data..."):
             app_state.reset_bse_documents_and_extracted_results() # reset previous documents and extracted results
             app_state.bse_documents_df = get_range_quarters_data_cached(app_state.scrip_code, start_quarter, start_fy, end_quarter, end_fy, configs)
+            try:
+                get_financials_dataset().append_announcements(app_state.scrip_code, app_state.bse_documents_df)
+            except Exception as e:
+                print("Could not store announcements: %s" % e)
 
     if app_state.bse_documents_df is not None:
         if app_state.bse_documents_df.empty:
             st.warning("No data found for this company and date range.")
         else:
-            app_state.bse_documents_pivot_df = pivot_announcement_links(app_state.bse_documents_df, configs)
-            pivot_html = render_pivot_html_with_icons(app_state.bse_documents_pivot_df)
+            # Pivot and html only change when bse_documents_df does, not on every widget rerun
+            app_state.bse_documents_pivot_df = app_state.memoize("bse_documents_df", "bse_documents_pivot_df", lambda df: pivot_announcement_links(df, configs))
+            pivot_html = app_state.memoize("bse_documents_df", "bse_documents_pivot_html", lambda df: render_pivot_html_with_icons(app_state.bse_documents_pivot_df))
+
+            # Start fetching the PDFs the user will most likely extract next, once per fetched data
+            if PDF_PREFETCH_MODE != "off":
+                prefetch_api_key = os.getenv("GEMINI_API_KEY") if PDF_PREFETCH_MODE == "upload" else None
+                app_state.memoize("bse_documents_df", "pdf_prefetch_links", lambda df: get_pdf_prefetcher().prefetch(df, api_key=prefetch_api_key, owner=app_state.session_token))
 
             st.success("Data fetched!")
             st.markdown("### Key documents uploaded to BSE")
@@ -82,9 +98,9 @@ def fetch_bse_documents_section():
 def extract_results_section():
     # Extract available quarters
     st.markdown("### Extract Financial Results using Google Gemini")
-    available_quarters = app_state.bse_documents_pivot_df.columns.levels[1]
+    available_quarters = app_state.memoize("bse_documents_df", "available_quarters", lambda df: sorted(app_state.bse_documents_pivot_df.columns.levels[1], key=quarter_sort_key, reverse=True))
     st.write("Results extraction wont work for Banks/NBFCs/Financials, yet!")
-    app_state.extract_selected_quarter = st.selectbox("Select a Quarter to Extract Financials", sorted(available_quarters, key=quarter_sort_key, reverse=True))
+    app_state.extract_selected_quarter = st.selectbox("Select a Quarter to Extract Financials", available_quarters)
     app_state.extract_type = st.selectbox("Select which results you want to extract", ["Consolidated", "Standalone"])
 
     # Conditional API key input for the user
@@ -105,6 +121,28 @@ def extract_results_section():
             app_state.extract_link_count = 0
             extract_results_from_pdf_ui(user_api_key)
 
+    # Pick up a job submitted earlier for this quarter, e.g. from another tab or before a reconnect
+    if app_state.extract_job_id is None and not extract_results:
+        job = get_extraction_job_queue().latest_job(app_state.scrip_code, app_state.extract_selected_quarter, app_state.extract_type)
+        if job is not None:
+            app_state.extract_job_id = job["id"]
+            app_state.extract_job_owned = False
+            app_state.extract_pdf_link = job["pdf_link"]
+            app_state.extract_link_count = job["link_index"]
+
+    # Poll the background job until it has results
+    if app_state.extract_job_id is not None and app_state.extracted_results is None:
+        job = get_extraction_job_queue().get_job(app_state.extract_job_id)
+        if job is not None and job["status"] == FAILED:
+            if app_state.extract_job_owned:
+                st.error("Error fetching or processing PDF:")
+                st.info(job["error"])
+            else:
+                # someone else's job failed after we picked it up, their error isn't ours to show
+                app_state.extract_job_id = None
+        else:
+            extraction_job_status_section()
+
     # Display extracted results if available
     if app_state.extracted_results is not None:
         st.subheader(f'Extracted Financials for {app_state.extract_selected_quarter}')
@@ -121,7 +159,7 @@ def extract_results_section():
             if try_next_pdf_file:
                 app_state.extract_link_count += 1
                 extract_results_from_pdf_ui(user_api_key)
-                # we may have new data, repaint, dont know why it needs this explicitly here
+                # repaint without the stale results, the new job is polled below
                 st.rerun()
         else:
             col1, col2 = st.columns(2)
@@ -138,33 +176,85 @@ def extract_results_section():
                 unsafe_allow_html=True
             )
 
-def extract_results_from_pdf_ui(user_api_key):
-    with st.spinner("Extracting data...be patient, this may take a few minutes..."):
-        # Filter df for selected quarter and Config == "results"
-        df_filtered = app_state.bse_documents_df[
-                            (app_state.bse_documents_df["Quarter_FY"] == app_state.extract_selected_quarter) & 
-                            (app_state.bse_documents_df["Config"].str.lower() == "results")
-                            ]
-        
-        if not df_filtered.empty:
-            # Pick the PDF link
-            app_state.extract_pdf_link = df_filtered.iloc[app_state.extract_link_count]["Link"]
-            if app_state.extract_pdf_link:
-                st.info(f"Letting AI do its thing on: {app_state.extract_pdf_link}")
-
-                try:
-                    df_results = extract_results_from_pdf_link(app_state.extract_selected_quarter, app_state.extract_type, app_state.extract_pdf_link, user_api_key)
-                except Exception as e:
-                    st.error(f"Error fetching or processing PDF: {e}")
-                    st.info(traceback.format_exc())
-                    df_results = None
-
-                app_state.extracted_results = df_results
-            else:
-                st.warning(f'No PDF[{app_state.extract_link_count}] link found for the selected quarter.')
+    financials_matrix_section(user_api_key)
+
+# ------------------------------
+# Multi-quarter financials matrix, only stale quarters get extracted
+# ------------------------------
+def financials_matrix_section(user_api_key):
+    st.markdown("### Multi-quarter Financials")
+    builder = FinancialsMatrixBuilder(get_financials_dataset())
+    queue = get_extraction_job_queue()
+    # dataset scans only when the documents, the type or the stored results change, not on every rerun
+    depends_on = (app_state.scrip_code, app_state.extract_type, queue.results_version)
+    stale_quarters = app_state.memoize("bse_documents_df", "financials_stale_quarters",
+                                       lambda df: builder.stale_quarters(app_state.scrip_code, app_state.extract_type, df), depends_on)
+
+    if stale_quarters:
+        st.write(f"{len(stale_quarters)} quarter(s) not extracted yet or with a changed PDF: {', '.join(stale_quarters)}")
+    update_matrix = st.button("Update Financials Matrix", disabled=not stale_quarters)
+    if update_matrix:
+        if user_api_key == "":
+            st.warning("Please provide your Google Gemini API key to proceed.")
         else:
-            st.warning("No 'results' found for this quarter.")
+            for quarter_fy, pdf_link in stale_quarters.items():
+                queue.submit(quarter_fy, app_state.extract_type, pdf_link, user_api_key, scrip_code=app_state.scrip_code, priority=PRIORITY_BATCH)
+            st.info(f"Queued {len(stale_quarters)} extraction(s), rerun the page in a while to see them in the matrix.")
+
+    matrix = app_state.memoize("bse_documents_df", "financials_matrix",
+                               lambda df: builder.build(app_state.scrip_code, app_state.extract_type), depends_on)
+    if not matrix.empty:
+        st.dataframe(matrix)
+        st.download_button(
+            label="Download Financials Matrix as CSV",
+            data=matrix.to_csv().encode("utf-8"),
+            file_name=f"financials_{app_state.company_name}_{app_state.extract_type}_matrix.csv",
+            mime="text/csv"
+        )
+
+def extract_results_from_pdf_ui(user_api_key):
+    """
+    Submit the extraction to the background job queue, results are picked up by extraction_job_status_section.
+    """
+    # Filter df for selected quarter and Config == "results"
+    df_filtered = app_state.bse_documents_df[
+                        (app_state.bse_documents_df["Quarter_FY"] == app_state.extract_selected_quarter) & 
+                        (app_state.bse_documents_df["Config"].str.lower() == "results")
+                        ]
     
+    if not df_filtered.empty:
+        # Pick the PDF link
+        app_state.extract_pdf_link = df_filtered.iloc[app_state.extract_link_count]["Link"]
+        if app_state.extract_pdf_link:
+            st.info(f"Letting AI do its thing on: {app_state.extract_pdf_link}")
+            app_state.extracted_results = None
+            app_state.extract_job_id = get_extraction_job_queue().submit(
+                app_state.extract_selected_quarter, app_state.extract_type, app_state.extract_pdf_link, user_api_key,
+                scrip_code=app_state.scrip_code, link_index=app_state.extract_link_count,
+                reuse_pending=False  # a click always extracts again, e.g. after empty or bad output
+            )
+            app_state.extract_job_owned = True
+        else:
+            st.warning(f'No PDF[{app_state.extract_link_count}] link found for the selected quarter.')
+    else:
+        st.warning("No 'results' found for this quarter.")
+
+# ------------------------------
+# Poll the background extraction job, only this fragment reruns while waiting
+# ------------------------------
+@st.fragment(run_every=2)
+def extraction_job_status_section():
+    job = get_extraction_job_queue().get_job(app_state.extract_job_id)
+    if job is None:
+        st.warning("Extraction job not found, please extract again.")
+    elif job["status"] == DONE:
+        app_state.extracted_results = job_results_to_dataframe(job)
+        st.rerun(scope="app")
+    elif job["status"] == FAILED:
+        # failures are shown by extract_results_section, stop polling
+        st.rerun(scope="app")
+    else:
+        st.info(f"Extraction {job['status']}...this may take a few minutes, you can keep using the app meanwhile.")
 
 # ------------------------------
 # Main APP UI
@@ -184,6 +274,9 @@ def main_app():
         if app_state.bse_documents_df is not None:
             extract_results_section()
 
-# Run the app
+# Run the app, under the profiler only when asked for (STREAMLIT_PROFILE=1, or =allow and ?profile=1)
 if __name__ == "__main__":
-    main_app()
+    if profiling_enabled():
+        run_profiled(main_app)
+    else:
+        main_app()
@@ -1,9 +1,18 @@
+import itertools
+import uuid
 import streamlit as st
 
+# Process wide counter, so a version is never reused even after a reset
+_version_counter = itertools.count(1)
+
 class StreamlitAppState:
     """
     Manages Streamlit session state in a structured way with getters and setters.
+    DataFrames listed in _versioned_keys get a new version whenever they are set, and
+    derived artifacts (pivot, html, ...) are memoized against that version.
     """
+    _versioned_keys = ["bse_documents_df", "extracted_results"]
+
     _defaults = {
             "scrip_code": None,
             "company_name": "",
@@ -14,7 +23,9 @@ class StreamlitAppState:
             "extract_type": None,
             "extract_pdf_link": None,
             "extracted_results": None,
-            "extract_link_count": 0
+            "extract_link_count": 0,
+            "extract_job_id": None,
+            "extract_job_owned": False
         }
     
     def __init__(self):
@@ -23,6 +34,13 @@ class StreamlitAppState:
         for key in keys_to_check:
             if key not in st.session_state:
                 st.session_state[key] = self._defaults[key]
+        if "data_versions" not in st.session_state:
+            st.session_state["data_versions"] = {}
+        if "derived_cache" not in st.session_state:
+            st.session_state["derived_cache"] = {}
+        # identifies this session to process wide helpers (e.g. the PDF prefetcher), survives resets
+        if "session_token" not in st.session_state:
+            st.session_state["session_token"] = uuid.uuid4().hex
         
 
     # Reset all state variables to defaults
@@ -33,7 +51,7 @@ class StreamlitAppState:
         # Initialize session state with defaults if not already set
         keys_to_reset = list(self._defaults.keys())
         for key in keys_to_reset:
-            st.session_state[key] = self._defaults[key]
+            self.set(key, self._defaults[key])
     
     # Reset only BSE documents and extracted results related state variables
     def reset_bse_documents_and_extracted_results(self):
@@ -48,9 +66,11 @@ class StreamlitAppState:
             "extract_pdf_link",
             "extracted_results",
             "extract_link_count",
+            "extract_job_id",
+            "extract_job_owned",
         ]
         for key in keys_to_reset:
-            st.session_state[key] = self._defaults[key]
+            self.set(key, self._defaults[key])
 
     # Reset only extracted results related state variables
     def reset_extracted_results(self):
@@ -63,9 +83,11 @@ class StreamlitAppState:
             "extract_pdf_link",
             "extracted_results",
             "extract_link_count",
+            "extract_job_id",
+            "extract_job_owned",
         ]
         for key in keys_to_reset:
-            st.session_state[key] = self._defaults[key]
+            self.set(key, self._defaults[key])
 
     # Generic getter
     def get(self, key):
@@ -74,6 +96,37 @@ class StreamlitAppState:
     # Generic setter
     def set(self, key, value):
         st.session_state[key] = value
+        if key in self._versioned_keys:
+            self._bump_version(key)
+
+    def _bump_version(self, key):
+        st.session_state["data_versions"][key] = next(_version_counter)
+        # drop artifacts derived from the old data
+        derived_cache = st.session_state["derived_cache"]
+        for name in [n for n, (source_key, _, _) in derived_cache.items() if source_key == key]:
+            del derived_cache[name]
+
+    def get_version(self, key):
+        """
+        Version of a versioned key, changes only when the key is set or reset.
+        """
+        return st.session_state["data_versions"].get(key, 0)
+
+    # Memoize artifacts derived from a versioned key
+    def memoize(self, source_key, name, compute, depends_on=None):
+        """
+        Return compute(source value), recomputed only when source_key has changed since the last call,
+        or when depends_on (any other hashable inputs, e.g. a selected type) differs from last time.
+        """
+        version = (self.get_version(source_key), depends_on)
+        derived_cache = st.session_state["derived_cache"]
+        cached = derived_cache.get(name)
+        if cached is not None and cached[0] == source_key and cached[1] == version:
+            return cached[2]
+
+        value = compute(self.get(source_key))
+        derived_cache[name] = (source_key, version, value)
+        return value
 
     # Specific helpers for common fields
     @property
@@ -156,3 +209,23 @@ class StreamlitAppState:
     @extract_link_count.setter
     def extract_link_count(self, value):
         self.set("extract_link_count", value)
+
+    @property
+    def extract_job_id(self):
+        return self.get("extract_job_id")
+
+    @extract_job_id.setter
+    def extract_job_id(self, value):
+        self.set("extract_job_id", value)
+
+    @property
+    def extract_job_owned(self):
+        return self.get("extract_job_owned")
+
+    @extract_job_owned.setter
+    def extract_job_owned(self, value):
+        self.set("extract_job_owned", value)
+
+    @property
+    def session_token(self):
+        return self.get("session_token")
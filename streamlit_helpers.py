@@ -1,10 +1,25 @@
 import requests
 from bse_core import get_range_quarters_data, search_bse_company
-from genai_extract_results import get_extracted_results, json_to_dataframe
+from genai_extract_results import GEMINI_MODEL, PROMPT_HASH, get_extracted_results, json_to_dataframe, upload_pdf
+from extraction_jobs import ExtractionJobQueue
+from gemini_scheduler import PRIORITY_INTERACTIVE
+from financials_dataset import FinancialsDataset
+from pdf_prefetch import PDF_PREFETCH_MODE, PdfPrefetcher
 import pandas as pd
-from io import BytesIO
 import streamlit as st
+import os
 import re  
+import tempfile
+
+# PDFs are streamed to a spooled temp file: kept in memory up to PDF_SPOOL_MEMORY_BYTES, on disk beyond that
+MAX_PDF_SIZE_BYTES = int(os.getenv("MAX_PDF_SIZE_MB", "50")) * 1024 * 1024
+PDF_SPOOL_MEMORY_BYTES = 2 * 1024 * 1024
+PDF_DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+PDF_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+}
 
 PDF_ICON_URL = "https://upload.wikimedia.org/wikipedia/commons/6/60/Adobe_Acrobat_Reader_icon_%282020%29.svg"
 
@@ -65,27 +80,60 @@ def get_range_quarters_data_cached(scrip_code, start_quarter, start_fy, end_quar
     return get_range_quarters_data(scrip_code, start_quarter, start_fy, end_quarter, end_fy, configs)
 
 
+#------------------------------
+# Download PDF in chunks into a spooled temporary file
+#------------------------------
+def download_pdf_to_spooled_file(pdf_link, max_bytes=MAX_PDF_SIZE_BYTES):
+    """
+    Stream the PDF at pdf_link into a SpooledTemporaryFile, so only one copy of it
+    exists and large filings go to disk instead of memory.
+    Raises ValueError if the PDF is larger than max_bytes. Caller must close the file.
+    """
+    with requests.get(pdf_link, allow_redirects=True, headers=PDF_HEADERS, stream=True, timeout=60) as pdf_response:
+        pdf_response.raise_for_status()
+
+        content_length = int(pdf_response.headers.get("Content-Length") or 0)
+        if content_length > max_bytes:
+            raise ValueError(f"PDF is {content_length} bytes, larger than the {max_bytes} bytes limit: {pdf_link}")
+
+        pdf_file = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MEMORY_BYTES)
+        total = 0
+        try:
+            for chunk in pdf_response.iter_content(chunk_size=PDF_DOWNLOAD_CHUNK_BYTES):
+                total += len(chunk)
+                if total > max_bytes:
+                    raise ValueError(f"PDF is larger than the {max_bytes} bytes limit: {pdf_link}")
+                pdf_file.write(chunk)
+        except BaseException:
+            pdf_file.close()
+            raise
+
+    pdf_file.seek(0)
+    return pdf_file
+
+
 #------------------------------
 # Extract results from PDF link using Gemini
 #------------------------------
-def extract_results_from_pdf_link(extract_selected_quarter, type, pdf_link, user_api_key):
+def extract_results_from_pdf_link(extract_selected_quarter, type, pdf_link, user_api_key, priority=PRIORITY_INTERACTIVE):
     """
     Given a PDF link, fetch the PDF and extract financial results using Google Gemini.
     type - consolidated or standalone
+    priority - scheduler priority of the Gemini calls, PRIORITY_BATCH for bulk extractions
     """
     quarter, year = extract_selected_quarter.split()  # "Q2", "FY2024"                      
-    headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-        "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    }
 
-    # Download PDF into BytesIO
-    pdf_response = requests.get(pdf_link, allow_redirects=True, headers=headers)
-    pdf_response.raise_for_status()
-    pdf_bytes = BytesIO(pdf_response.content)
+    # Use the prefetched PDF (and its Gemini upload) if there is one
+    prefetched = get_pdf_prefetcher().take(pdf_link, user_api_key) if PDF_PREFETCH_MODE != "off" else None
+    pdf_file, uploaded_file = prefetched or (None, None)
 
-    # Call Gemini to extract results
-    response = get_extracted_results(quarter, year, type, pdf_bytes, api_key=user_api_key)
+    # Otherwise stream the PDF to a temp file and upload straight from it
+    if pdf_file is None:
+        pdf_file = download_pdf_to_spooled_file(pdf_link)
+
+    with pdf_file:
+        # Call Gemini to extract results
+        response = get_extracted_results(quarter, year, type, pdf_file, api_key=user_api_key, uploaded_file=uploaded_file, priority=priority)
 
     # Convert JSON to DataFrame
     df_results = json_to_dataframe(response.text)
@@ -102,6 +150,38 @@ def extract_results_from_pdf_link(extract_selected_quarter, type, pdf_link, user
     return df_results
     
 
+# ------------------------------
+# One background extraction queue per process, shared by all sessions
+# ------------------------------
+@st.cache_resource
+def get_extraction_job_queue():
+    return ExtractionJobQueue(
+        extract_results_from_pdf_link, on_done=store_job_results, model=GEMINI_MODEL, prompt_hash=PROMPT_HASH
+    ).start()
+
+
+# ------------------------------
+# Speculative PDF prefetcher, opt-in with PDF_PREFETCH=download|upload
+# ------------------------------
+@st.cache_resource
+def get_pdf_prefetcher():
+    return PdfPrefetcher(download_pdf_to_spooled_file, upload_pdf)
+
+
+# ------------------------------
+# Columnar dataset of announcements and extracted results
+# ------------------------------
+@st.cache_resource
+def get_financials_dataset():
+    return FinancialsDataset()
+
+def store_job_results(job, df_results):
+    get_financials_dataset().append_financials(
+        job["scrip_code"], job["quarter"], job["type"], df_results,
+        pdf_link=job["pdf_link"], model=GEMINI_MODEL, prompt_hash=PROMPT_HASH
+    )
+
+
 # ------------------------------
 # Pivot announcement links
 # ------------------------------
@@ -0,0 +1,105 @@
+import pandas as pd
+import pytest
+
+import bse_watch
+from bse_watch import BseWatcher, extraction_queue_callback, reported_quarter_fy
+from gemini_scheduler import PRIORITY_BATCH
+
+RESULT_CONFIG = {"name": "Results", "category": "Result"}
+
+
+def filings(*rows):
+    return pd.DataFrame(rows, columns=["Date", "Headline", "Link"])
+
+
+def make_watcher(tmp_path, on_new_filings=None, **kwargs):
+    return BseWatcher(["500825"], on_new_filings or (lambda *args: None), configs=[RESULT_CONFIG],
+                      state_path=str(tmp_path / "watch_state.json"), **kwargs)
+
+
+def test_new_filings_move_the_high_water_mark(tmp_path):
+    watcher = make_watcher(tmp_path)
+    existing = filings(("2025-05-01", "Results Q4", "https://example.invalid/a.pdf"))
+    # filings already there on the first poll are only recorded
+    assert watcher._new_filings("500825", RESULT_CONFIG, existing).empty
+
+    same_day = pd.concat([existing, filings(("2025-05-01", "Results Q4 revised", None))])
+    new = watcher._new_filings("500825", RESULT_CONFIG, same_day)
+    assert new["Headline"].tolist() == ["Results Q4 revised"]
+    # seen filings, also those without a link, are not sent again
+    assert watcher._new_filings("500825", RESULT_CONFIG, same_day).empty
+
+    next_day = pd.concat([same_day, filings(("2025-05-02", "Results Q4 audited", None))])
+    assert watcher._new_filings("500825", RESULT_CONFIG, next_day)["Headline"].tolist() == ["Results Q4 audited"]
+    assert watcher.high_water_marks["500825|Result||"] == {"date": "2025-05-02", "links": ["2025-05-02|Results Q4 audited"]}
+
+
+def test_emit_existing_sends_the_first_poll(tmp_path):
+    watcher = make_watcher(tmp_path, emit_existing=True)
+    existing = filings(("2025-05-01", "Results Q4", "https://example.invalid/a.pdf"))
+    assert len(watcher._new_filings("500825", RESULT_CONFIG, existing)) == 1
+
+
+def test_poll_interval_backs_off_and_resets(tmp_path, monkeypatch):
+    df = filings(("2025-05-01", "Results Q4", "https://example.invalid/a.pdf"))
+    monkeypatch.setattr(bse_watch, "get_bse_data_by_config", lambda *args: df)
+    received = []
+    watcher = make_watcher(tmp_path, lambda scrip_code, config, df_new: received.append(len(df_new)),
+                           emit_existing=True, min_interval=10, max_interval=30, backoff=2)
+
+    assert watcher.poll_once() == 1 and watcher.interval == 10
+    assert watcher.poll_once() == 0 and watcher.interval == 20
+    assert watcher.poll_once() == 0 and watcher.interval == 30
+    assert watcher.poll_once() == 0 and watcher.interval == 30
+
+    # a restarted watcher picks up the saved mark and sends nothing again
+    restarted = make_watcher(tmp_path, lambda *args: received.append("again"), emit_existing=True)
+    assert restarted.poll_once() == 0
+
+    df = pd.concat([df, filings(("2025-05-03", "Results Q4 audited", "https://example.invalid/b.pdf"))])
+    assert watcher.poll_once() == 1 and watcher.interval == 10
+    assert received == [1, 1]
+
+
+def test_failing_callback_does_not_stop_the_poll(tmp_path, monkeypatch):
+    monkeypatch.setattr(bse_watch, "get_bse_data_by_config",
+                        lambda scrip_code, *args: filings(("2025-05-01", "Results Q4", f"https://example.invalid/{scrip_code}.pdf")))
+    received = []
+
+    def on_new_filings(scrip_code, config, df_new):
+        received.append(scrip_code)
+        raise RuntimeError("queue unavailable")
+
+    watcher = BseWatcher(["500825", "500180"], on_new_filings, configs=[RESULT_CONFIG],
+                         state_path=str(tmp_path / "watch_state.json"), emit_existing=True)
+    assert watcher.poll_once() == 2
+    assert received == ["500825", "500180"]
+
+
+@pytest.mark.parametrize("filing_date, quarter_fy", [
+    ("2025-04-10", "Q4 FY2025"),
+    ("2025-07-25", "Q1 FY2026"),
+    ("2025-10-30", "Q2 FY2026"),
+    ("2026-01-20", "Q3 FY2026"),
+    ("2026-03-31", "Q3 FY2026"),
+])
+def test_reported_quarter_fy(filing_date, quarter_fy):
+    assert reported_quarter_fy(filing_date) == quarter_fy
+
+
+def test_extraction_queue_callback_submits_result_filings_as_batch():
+    class FakeQueue:
+        def __init__(self):
+            self.submitted = []
+
+        def submit(self, quarter, type, pdf_link, api_key, **kwargs):
+            self.submitted.append((quarter, pdf_link, kwargs))
+
+    queue = FakeQueue()
+    callback = extraction_queue_callback(queue, "key")
+    df_new = filings(("2025-07-25", "Results Q1", "https://example.invalid/a.pdf"), ("2025-07-26", "Results Q1", None))
+    callback("500825", RESULT_CONFIG, df_new)
+    callback("500825", {"name": "Results", "category": "Board Meeting", "filter": "result"}, df_new)
+    assert queue.submitted == [
+        ("Q1 FY2026", "https://example.invalid/a.pdf", {"scrip_code": "500825", "priority": PRIORITY_BATCH}),
+    ]
@@ -0,0 +1,124 @@
+import time
+
+import pandas as pd
+
+from extraction_jobs import DONE, FAILED, QUEUED, RUNNING, ExtractionJobQueue, job_results_to_dataframe
+from gemini_scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE
+
+RESULTS = pd.DataFrame({"Field": ["CoreRevenue", "FinanceCost"], "Q2 FY2025": [1234.5, None]})
+
+
+def make_queue(tmp_path, extract_fn=None, **kwargs):
+    calls = []
+
+    def fake_extract(quarter, type, pdf_link, api_key, priority=None):
+        calls.append((pdf_link, api_key, priority))
+        return RESULTS
+
+    queue = ExtractionJobQueue(extract_fn or fake_extract, db_path=str(tmp_path / "jobs.db"), poll_seconds=0.05, **kwargs)
+    return queue, calls
+
+
+def wait_for_job(queue, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get_job(job_id)
+        if job["status"] in (DONE, FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_claim_order_is_priority_then_submission(tmp_path):
+    queue, _ = make_queue(tmp_path)
+    batch_1 = queue.submit("Q1 FY2025", "Consolidated", "a.pdf", "key", priority=PRIORITY_BATCH)
+    click_1 = queue.submit("Q1 FY2025", "Consolidated", "b.pdf", "key")
+    batch_2 = queue.submit("Q1 FY2025", "Consolidated", "c.pdf", "key", priority=PRIORITY_BATCH)
+    click_2 = queue.submit("Q1 FY2025", "Consolidated", "d.pdf", "key", priority=PRIORITY_INTERACTIVE)
+
+    claimed = [queue._claim_next_job()["id"] for _ in range(4)]
+    assert claimed == [click_1, click_2, batch_1, batch_2]
+    assert queue._claim_next_job() is None
+
+
+def test_running_jobs_are_queued_again_on_restart(tmp_path):
+    queue, _ = make_queue(tmp_path)
+    job_id = queue.submit("Q1 FY2025", "Consolidated", "a.pdf", "key")
+    queue._claim_next_job()
+    assert queue.get_job(job_id)["status"] == RUNNING
+
+    restarted, _ = make_queue(tmp_path)
+    assert restarted.get_job(job_id)["status"] == QUEUED
+
+
+def test_submit_reuses_only_pending_jobs(tmp_path):
+    queue, _ = make_queue(tmp_path)
+    job_id = queue.submit("Q1 FY2025", "Consolidated", "a.pdf", "key", priority=PRIORITY_BATCH)
+    # a more urgent submission of the same PDF moves the queued job up
+    assert queue.submit("Q1 FY2025", "Consolidated", "a.pdf", "key") == job_id
+    assert queue.get_job(job_id)["priority"] == PRIORITY_INTERACTIVE
+    assert queue.submit("Q1 FY2025", "Standalone", "a.pdf", "key") != job_id
+
+    queue._claim_next_job()
+    assert queue.submit("Q1 FY2025", "Consolidated", "a.pdf", "key") == job_id
+    queue._finish_job(job_id, DONE, result_json=RESULTS.to_json(orient="split"))
+    resubmitted_id = queue.submit("Q1 FY2025", "Consolidated", "a.pdf", "key")
+    assert resubmitted_id != job_id
+    # an explicit click doesn't wait on a pending job either
+    assert queue.submit("Q1 FY2025", "Consolidated", "a.pdf", "key", reuse_pending=False) not in (job_id, resubmitted_id)
+
+
+def test_latest_job_picks_up_results_of_the_same_model_and_prompt(tmp_path):
+    queue, _ = make_queue(tmp_path, model="gemini-2.5-flash", prompt_hash="abc")
+    job_id = queue.submit("Q1 FY2025", "Consolidated", "a.pdf", "key", scrip_code="500825")
+    queue._claim_next_job()
+    queue._finish_job(job_id, DONE, result_json=RESULTS.to_json(orient="split"))
+    assert queue.latest_job("500825", "Q1 FY2025", "Consolidated")["id"] == job_id
+
+    failed_id = queue.submit("Q1 FY2025", "Consolidated", "b.pdf", "key", scrip_code="500825")
+    queue._finish_job(failed_id, FAILED, error="boom")
+    assert queue.latest_job("500825", "Q1 FY2025", "Consolidated")["id"] == job_id
+
+    new_prompt, _ = make_queue(tmp_path, model="gemini-2.5-flash", prompt_hash="def")
+    assert new_prompt.latest_job("500825", "Q1 FY2025", "Consolidated") is None
+
+
+def test_worker_falls_back_to_the_environment_api_key(tmp_path, monkeypatch):
+    queue, _ = make_queue(tmp_path)
+    job_id = queue.submit("Q1 FY2025", "Consolidated", "a.pdf", "user-key")
+
+    # the in-memory key is gone after a restart
+    monkeypatch.setenv("GEMINI_API_KEY", "env-key")
+    restarted, calls = make_queue(tmp_path)
+    restarted.start()
+    try:
+        assert wait_for_job(restarted, job_id)["status"] == DONE
+    finally:
+        restarted.stop()
+    assert calls == [("a.pdf", "env-key", PRIORITY_INTERACTIVE)]
+
+    monkeypatch.delenv("GEMINI_API_KEY")
+    orphan_id = queue.submit("Q2 FY2025", "Consolidated", "b.pdf", "user-key")
+    restarted, calls = make_queue(tmp_path)
+    restarted.start()
+    try:
+        job = wait_for_job(restarted, orphan_id)
+    finally:
+        restarted.stop()
+    assert job["status"] == FAILED and "No Gemini API key" in job["error"]
+    assert calls == []
+
+
+def test_job_results_round_trip(tmp_path):
+    stored = []
+    queue, _ = make_queue(tmp_path, on_done=lambda job, df: stored.append(job["id"]))
+    queue.start()
+    try:
+        job_id = queue.submit("Q2 FY2025", "Consolidated", "a.pdf", "key")
+        job = wait_for_job(queue, job_id)
+    finally:
+        queue.stop()
+
+    assert stored == [job_id] and queue.results_version == 1
+    pd.testing.assert_frame_equal(job_results_to_dataframe(job), RESULTS)
+    assert job_results_to_dataframe(None) is None
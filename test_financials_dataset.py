@@ -0,0 +1,70 @@
+import pandas as pd
+
+import extract_results_prompt
+from financials_cube import FinancialsCube
+from financials_dataset import FinancialsDataset
+from financials_matrix import FinancialsMatrixBuilder
+
+
+def make_results(quarter_fy, revenue, finance_cost):
+    fields = list(extract_results_prompt.StandardFields) + ["Other comprehensive income"]
+    values = [None] * len(fields)
+    values[fields.index("CoreRevenue")] = revenue
+    values[fields.index("FinanceCost")] = finance_cost
+    return pd.DataFrame({"Field": fields, quarter_fy: values})
+
+
+def test_announcements_round_trip(tmp_path):
+    dataset = FinancialsDataset(str(tmp_path))
+    df = pd.DataFrame({
+        "Config": ["Results", "Transcript"],
+        "Date": ["2024-07-20", "2024-07-25"],
+        "Headline": ["Results Q1", "Transcript Q1"],
+        "Title": ["Financial results", "Earnings call"],
+        "Link": ["https://example.invalid/a.pdf", "https://example.invalid/b.pdf"],
+        "Quarter": [1, 1],
+        "FiscalYear": [2025, 2025],
+    })
+    dataset.append_announcements("500825", df)
+    dataset.append_announcements("500825", df.iloc[:1])  # a later fetch replaces the quarter
+
+    read = dataset.read_announcements(scrip_codes=["500825"], fiscal_years=[2025], columns=["config", "link"])
+    assert read.to_dict("records") == [{"config": "Results", "link": "https://example.invalid/a.pdf"}]
+    assert len(dataset.read_announcements(latest_only=False)) == 3
+    assert dataset.read_announcements(scrip_codes=["500180"]).empty
+
+
+def test_financials_matrix_and_cube_round_trip(tmp_path):
+    dataset = FinancialsDataset(str(tmp_path / "dataset"))
+    provenance = {"model": "gemini-2.5-flash", "prompt_hash": "abc"}
+    for i, quarter_fy in enumerate(["Q1 FY2024", "Q2 FY2024", "Q3 FY2024", "Q4 FY2024", "Q1 FY2025"]):
+        dataset.append_financials("500825", quarter_fy, "Consolidated", make_results(quarter_fy, 100 + 10 * i, 5 - i),
+                                  pdf_link=f"https://example.invalid/{i}.pdf", **provenance)
+    dataset.append_financials("500180", "Q1 FY2025", "Consolidated", make_results("Q1 FY2025", 50, 9),
+                              pdf_link="https://example.invalid/x.pdf", **provenance)
+
+    matrix = FinancialsMatrixBuilder(dataset).build("500825", "Consolidated")
+    assert list(matrix.columns) == ["Q1 FY2024", "Q2 FY2024", "Q3 FY2024", "Q4 FY2024", "Q1 FY2025"]
+    assert matrix.index[0] == "CoreRevenue"
+    assert matrix.index[-1] == "Other comprehensive income"
+    assert matrix.loc["CoreRevenue", "Q1 FY2025"] == 140
+
+    documents = pd.DataFrame({
+        "Config": ["Results", "Results"],
+        "Link": ["https://example.invalid/4.pdf", "https://example.invalid/new.pdf"],
+        "Quarter": [1, 2],
+        "FiscalYear": [2025, 2025],
+    })
+    stale = FinancialsMatrixBuilder(dataset).stale_quarters("500825", "Consolidated", documents)
+    assert stale == {"Q2 FY2025": "https://example.invalid/new.pdf"}
+
+    cube = FinancialsCube.build(dataset, root_dir=str(tmp_path / "cube"))
+    assert cube.values.shape == (2, len(extract_results_prompt.StandardFields), 5)
+    mask = (cube.yoy_growth("CoreRevenue") > 0.2) & (cube.change("FinanceCost") < 0)
+    assert cube.screen(mask) == ["500825"]
+    assert cube.screen(mask, quarter="Q4 FY2024") == []
+
+    # a rebuild keeps the file it replaces for readers still on the old meta.json, and drops anything older
+    FinancialsCube.build(dataset, root_dir=str(tmp_path / "cube"))
+    FinancialsCube.build(dataset, root_dir=str(tmp_path / "cube"))
+    assert len(list((tmp_path / "cube").glob("values-*.f4"))) == 2
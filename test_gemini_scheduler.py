@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+from google.genai.errors import ClientError, ServerError
+
+import gemini_scheduler
+from gemini_scheduler import (
+    PRIORITY_BATCH, PRIORITY_INTERACTIVE, CircuitBreaker, CircuitOpenError, GeminiScheduler, TokenBucket,
+    get_retry_after_seconds,
+)
+
+
+def quota_error(retry_delay="2s"):
+    return ClientError(429, {"error": {
+        "code": 429, "message": "Resource has been exhausted", "status": "RESOURCE_EXHAUSTED",
+        "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": retry_delay}],
+    }})
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(rate_per_minute=60)
+    assert bucket.wait_time(60) == 0
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1, abs=0.05)
+    # more than the capacity only waits for a full bucket
+    assert bucket.wait_time(600) == pytest.approx(60, abs=0.05)
+    bucket.drain_for(30)
+    assert bucket.wait_time(1) == pytest.approx(31, abs=0.05)
+
+
+def test_retry_delay_is_read_from_retry_info():
+    assert get_retry_after_seconds(quota_error("34s")) == 34
+    assert get_retry_after_seconds(ServerError(503, {"error": {"code": 503, "message": "unavailable"}})) is None
+
+
+def test_quota_error_honours_the_retry_delay(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(gemini_scheduler.time, "sleep", sleeps.append)
+    scheduler = GeminiScheduler(rpm=600, tpm=100000)
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise quota_error("0.3s")
+        return "ok"
+
+    assert scheduler.call(fn, "key", base_wait=0.01) == "ok"
+    assert len(attempts) == 2 and sleeps[0] >= 0.3
+    # a 429 says nothing about API health, the breaker stays closed
+    assert scheduler._get_limits("key").breaker.failures == 0
+
+
+def test_interactive_calls_go_before_batch():
+    scheduler = GeminiScheduler(rpm=600, tpm=100000)
+    limits = scheduler._get_limits("key")
+    limits.requests.drain_for(0.5)  # everyone waits, so both calls are queued before either goes out
+    order = []
+
+    def submit(name, priority, waiting):
+        thread = threading.Thread(target=scheduler.call, args=(lambda: order.append(name), "key"), kwargs={"priority": priority})
+        thread.start()
+        deadline = time.monotonic() + 2
+        while len(limits.waiting) < waiting and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return thread
+
+    batch = submit("batch", PRIORITY_BATCH, waiting=1)
+    interactive = submit("interactive", PRIORITY_INTERACTIVE, waiting=2)
+    batch.join(5)
+    interactive.join(5)
+    assert order == ["interactive", "batch"]
+
+
+def test_breaker_lets_a_single_trial_through_after_reset_timeout():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.check() is False
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    time.sleep(0.06)
+    assert breaker.check() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+    # a failed trial opens the breaker for another reset_timeout
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    time.sleep(0.06)
+    assert breaker.check() is True
+    breaker.record_success()
+    assert breaker.check() is False
+
+
+def test_scheduler_releases_the_trial_on_a_client_error():
+    scheduler = GeminiScheduler(rpm=600, tpm=100000)
+    breaker = scheduler._get_limits("key").breaker
+    breaker.reset_timeout = 0
+    breaker.opened_at = time.monotonic()
+
+    def bad_request():
+        raise ClientError(400, {"error": {"code": 400, "message": "bad request"}})
+
+    with pytest.raises(ClientError):
+        scheduler.call(bad_request, "key")
+    # the 400 told us nothing about the API, the next call is the trial instead
+    assert scheduler.call(lambda: "ok", "key") == "ok"
+    assert breaker.opened_at is None